@@ -0,0 +1,160 @@
+"""Admission control for the /query hot path.
+
+- SingleFlight: identical concurrent requests share one in-flight execution.
+- AdmissionLimiter: at most RAG_QUERY_MAX_CONCURRENCY searches run against the
+  vector store at once; up to RAG_QUERY_MAX_QUEUE more wait (for at most
+  RAG_QUERY_QUEUE_TIMEOUT_MS), anything beyond that is shed with Overloaded so
+  the endpoint can answer 429 immediately.
+
+Queue wait times and counters are kept in QUERY_METRICS and rendered in the
+Prometheus text format by render_metrics().
+"""
+import asyncio
+import os
+import time
+
+MAX_CONCURRENCY = int(os.getenv("RAG_QUERY_MAX_CONCURRENCY", "8"))
+MAX_QUEUE = int(os.getenv("RAG_QUERY_MAX_QUEUE", "64"))
+QUEUE_TIMEOUT_MS = float(os.getenv("RAG_QUERY_QUEUE_TIMEOUT_MS", "2000"))
+
+# Upper bounds (seconds) of the queue wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued."""
+
+
+class WaitHistogram:
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class QueryMetrics:
+    def __init__(self):
+        self.queue_wait = WaitHistogram()
+        self.admitted = 0
+        self.shed = 0
+        self.coalesced = 0
+        self.in_flight = 0
+        self.queued = 0
+
+
+QUERY_METRICS = QueryMetrics()
+
+
+class SingleFlight:
+    """Run one coroutine per key; concurrent callers with the same key await its result."""
+
+    def __init__(self, metrics=QUERY_METRICS):
+        self._calls = {}
+        self.metrics = metrics
+
+    def in_flight(self, key):
+        return key in self._calls
+
+    async def do(self, key, make_coro):
+        future = self._calls.get(key)
+        if future is not None:
+            self.metrics.coalesced += 1
+            # shield: a cancelled follower must not cancel the leader's work
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await make_coro()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody else awaited is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+class AdmissionLimiter:
+    """Bounded concurrency with a bounded wait queue and fast load-shedding."""
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE,
+                 queue_timeout_ms=QUEUE_TIMEOUT_MS, metrics=QUERY_METRICS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.metrics = metrics
+        self._semaphore = None
+
+    def _sem(self):
+        # Created lazily so it binds to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(self, make_coro):
+        sem = self._sem()
+        m = self.metrics
+        if sem.locked() and m.queued >= self.max_queue:
+            m.shed += 1
+            raise Overloaded("query queue is full")
+
+        start = time.perf_counter()
+        if not sem.locked():
+            # Free slot: acquire() returns without suspending
+            await sem.acquire()
+        else:
+            m.queued += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                m.shed += 1
+                raise Overloaded("timed out waiting for a query slot")
+            finally:
+                m.queued -= 1
+        m.queue_wait.observe(time.perf_counter() - start)
+
+        m.admitted += 1
+        m.in_flight += 1
+        try:
+            return await make_coro()
+        finally:
+            m.in_flight -= 1
+            sem.release()
+
+
+def render_metrics(metrics=QUERY_METRICS):
+    """Prometheus text exposition of the query admission metrics."""
+    h = metrics.queue_wait
+    lines = [
+        "# HELP rag_query_queue_wait_seconds Time /query requests waited for a search slot.",
+        "# TYPE rag_query_queue_wait_seconds histogram",
+    ]
+    cumulative = 0
+    for bound, count in zip(h.buckets, h.counts):
+        cumulative += count
+        lines.append(f'rag_query_queue_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+    lines.append(f'rag_query_queue_wait_seconds_bucket{{le="+Inf"}} {h.count}')
+    lines.append(f"rag_query_queue_wait_seconds_sum {h.sum}")
+    lines.append(f"rag_query_queue_wait_seconds_count {h.count}")
+    for name, kind, help_text, value in (
+        ("rag_query_admitted_total", "counter", "Searches admitted past the limiter.", metrics.admitted),
+        ("rag_query_shed_total", "counter", "Requests rejected with 429.", metrics.shed),
+        ("rag_query_coalesced_total", "counter", "Requests served by an identical in-flight request.", metrics.coalesced),
+        ("rag_query_in_flight", "gauge", "Searches currently running.", metrics.in_flight),
+        ("rag_query_queued", "gauge", "Requests waiting for a search slot.", metrics.queued),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Compare per-file /ingest uploads with one /ingest/bulk request.
+
+A corpus of generated .txt documents is ingested into a fresh NumPy store,
+through the in-process ASGI app, in each of these ways:
+
+    per-file      one /ingest request per document, sent one after another
+    per-file x8   one /ingest request per document, 8 in flight
+    bulk files    a single /ingest/bulk multipart request with every document
+    bulk zip      a single /ingest/bulk request carrying a zip of the corpus
+
+Each mode runs in a fresh child process. --store-latency-ms adds a sleep to
+every upsert to stand in for the round trip to a remote Qdrant.
+
+Run from the rag-service directory:
+    python -m app.benchmark_bulk_ingest --docs 500
+    python -m app.benchmark_bulk_ingest --docs 200 --store-latency-ms 10
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import zipfile
+
+MODES = ("per-file", "per-file x8", "bulk files", "bulk zip")
+
+WORDS = ("vector", "index", "query", "document", "section", "category", "policy", "report", "budget",
+         "contract", "clause", "annex", "review", "schedule", "payment", "delivery", "quality", "audit")
+
+
+def _corpus(docs, size, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(docs):
+        sentences = []
+        while sum(len(s) for s in sentences) < size:
+            sentences.append(" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ".")
+        out.append((f"doc-{i:04d}.txt", " ".join(sentences).encode()))
+    return out
+
+
+def _run_mode(mode, args, queue):
+    try:
+        queue.put(_bench(mode, args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _bench(mode, args):
+    work = tempfile.mkdtemp(prefix="bench_bulk_")
+    os.chdir(work)
+    os.environ.update({"VECTOR_DB": "numpy", "VECTOR_DB_PATH": os.path.join(work, "vectors"), "RAG_CHUNK_STORE": ""})
+    import asyncio
+    import builtins
+    import httpx
+    from app import app as service
+    from app import ingest
+
+    # The ingest path logs every chunk; keep the timing about the work
+    builtins.print = lambda *a, **kw: None
+
+    corpus = _corpus(args.docs, args.doc_chars)
+    client, _ = ingest.initialize_vector_db()
+    if args.store_latency_ms:
+        upsert = client.upsert
+        delay = args.store_latency_ms / 1000
+
+        def slow_upsert(*a, **kw):
+            time.sleep(delay)
+            return upsert(*a, **kw)
+        client.upsert = slow_upsert
+
+    async def main():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as http:
+            if mode == "bulk zip":
+                buf = io.BytesIO()
+                with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+                    for name, data in corpus:
+                        zf.writestr(f"corpus/{name}", data)
+                files = [("files", ("corpus.zip", buf.getvalue()))]
+            else:
+                files = [("files", (name, data)) for name, data in corpus]
+
+            start = time.perf_counter()
+            if mode.startswith("per-file"):
+                sem = asyncio.Semaphore(8 if mode.endswith("x8") else 1)
+
+                async def one(name, data):
+                    async with sem:
+                        r = await http.post("/ingest", files={"file": (name, data)})
+                        return r.status_code == 200
+                ok = sum(await asyncio.gather(*(one(n, d) for n, d in corpus)))
+            else:
+                r = await http.post("/ingest/bulk", files=files)
+                ok = r.json().get("ingested", 0) if r.status_code == 200 else 0
+            elapsed = time.perf_counter() - start
+
+            listed = (await http.get("/indexed/files")).json()
+        return {
+            "mode": mode,
+            "seconds": round(elapsed, 2),
+            "docs_per_s": round(len(corpus) / elapsed, 1),
+            "ingested": ok,
+            "indexed_files": listed.get("total_files"),
+        }
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--doc-chars", type=int, default=4000)
+    parser.add_argument("--store-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'mode':<12} {'seconds':>8} {'docs/s':>8} {'ingested':>9} {'indexed':>8}")
+    for mode in MODES:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_mode, args=(mode, args, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        if "error" in result:
+            print(f"{mode:<12} failed: {result['error']}")
+            continue
+        print(f"{mode:<12} {result['seconds']:>8} {result['docs_per_s']:>8} {result['ingested']:>9} "
+              f"{result['indexed_files']:>8}")
+
+
+if __name__ == "__main__":
+    main()
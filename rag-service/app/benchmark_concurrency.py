@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Load test: /query throughput of one worker under many concurrent clients.
+
+Compares the handlers with blocking store calls made on the event loop
+("inline", how the endpoints used to call the vector store) against the
+dedicated executor from app.executor ("executor"). Each mode runs in a fresh
+child process against the in-process ASGI app, backed by a NumPy store seeded
+with random vectors. --store-latency-ms adds a sleep to every search to stand in
+for the network round trip to a remote Qdrant; that waiting is what the
+executor overlaps. With --store-latency-ms 0 the in-process NumPy search is
+CPU-bound under the GIL and the inline mode can come out ahead.
+
+Run from the rag-service directory:
+    python -m app.benchmark_concurrency --concurrency 64 --requests 1000
+    python -m app.benchmark_concurrency --store-latency-ms 20 --concurrency 100
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+
+def _run_mode(mode, args, queue):
+    try:
+        queue.put(_bench(mode, args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _bench(mode, args):
+    tmp = tempfile.mkdtemp(prefix="bench_concurrency_")
+    os.environ.update({
+        "VECTOR_DB": "numpy",
+        "VECTOR_DB_PATH": tmp,
+        "RAG_CHUNK_STORE": "",
+        "RAG_QUERY_MAX_CONCURRENCY": str(args.concurrency),
+        "RAG_QUERY_MAX_QUEUE": str(args.concurrency * 2),
+    })
+    import asyncio
+    import httpx
+    from app import app as service
+    from app import ingest
+
+    client, embed = ingest.initialize_vector_db()
+    points = []
+    for i in range(args.points):
+        text = f"document {i % 50} section {i} about topic {i % 17}"
+        points.append({"id": str(uuid.uuid4()), "vector": embed(text),
+                       "payload": {"content": text, "file_path": f"./temp/doc{i % 50}.txt", "chunk_id": i}})
+    for i in range(0, len(points), 500):
+        client.upsert(collection_name="file_vectors", points=points[i:i + 500])
+
+    if args.store_latency_ms:
+        search = client.search
+        delay = args.store_latency_ms / 1000
+
+        def slow_search(*a, **kw):
+            time.sleep(delay)
+            return search(*a, **kw)
+        client.search = slow_search
+
+    if mode == "inline":
+        async def run_inline(fn, *a, **kw):
+            return fn(*a, **kw)
+        service.run_db = run_inline
+
+    async def main():
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+            latencies, statuses = [], {}
+            counter = iter(range(args.requests))
+
+            async def worker():
+                for i in counter:
+                    # Distinct questions so single-flight does not coalesce them
+                    body = {"question": f"topic {i % 17} section {i}", "limit": 5, "merge_adjacent": False}
+                    start = time.perf_counter()
+                    r = await http.post("/query", json=body)
+                    latencies.append(time.perf_counter() - start)
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "mode": mode,
+            "throughput_qps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+            "statuses": statuses,
+        }
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=5000)
+    parser.add_argument("--store-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'mode':<10} {'qps':>8} {'p50 ms':>9} {'p95 ms':>9}  statuses")
+    for mode in ("inline", "executor"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_mode, args=(mode, args, queue))
+        proc.start()
+        result = queue.get()
+        proc.join()
+        if "error" in result:
+            print(f"{mode:<10} failed: {result['error']}")
+            continue
+        print(f"{mode:<10} {result['throughput_qps']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9}  {result['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
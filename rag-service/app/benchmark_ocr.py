@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark image OCR with and without preprocessing (downscale, grayscale,
+text-height scaling, deskew).
+
+Each image is processed in a fresh child process so peak memory can be read from
+getrusage: "self" is the Python process (decode + preprocessing), "ocr" is the
+tesseract subprocess. Times are split into preprocessing and OCR, and the
+summary compares OCR time of the raw and preprocessed images. Fails when the
+preprocessed path exceeds the memory ceiling.
+
+Run from the rag-service directory:
+    python -m app.benchmark_ocr                      # synthetic phone-photo fixtures
+    python -m app.benchmark_ocr --fixtures ./fixtures/ocr --max-rss-mb 400
+    python -m app.benchmark_ocr --no-ocr             # preprocessing only, no tesseract
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+
+def make_fixtures(directory, count=3, font_size=64):
+    """Write synthetic 12MP 'phone photos' of a slightly rotated text page.
+
+    Like real phone photos they report 72 DPI, and a page filling the frame
+    gives text lines of roughly 60-70 pixels.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        # Pillow < 10.1 has only the small bitmap font
+        font = ImageFont.load_default()
+    paths = []
+    for i in range(count):
+        image = Image.new("RGB", (4032, 3024), "white")
+        draw = ImageDraw.Draw(image)
+        for line, y in enumerate(range(150, 2900, int(font_size * 1.5))):
+            draw.text((200, y), f"Line {line}: the quick brown fox jumps over the lazy dog", fill="black", font=font)
+        image = image.rotate(1.5 * (i + 1), fillcolor="white")
+        path = Path(directory) / f"phone_{i}.jpg"
+        image.save(path, quality=90, dpi=(72, 72))
+        paths.append(path)
+    return paths
+
+
+def _run_one(path, preprocess, run_ocr, queue):
+    try:
+        queue.put(_process(path, preprocess, run_ocr))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _process(path, preprocess, run_ocr):
+    from PIL import Image
+    from app.ingest import preprocess_image_for_ocr
+
+    start = time.perf_counter()
+    with Image.open(path) as image:
+        prepared = preprocess_image_for_ocr(image) if preprocess else image.copy()
+    prep_time = time.perf_counter() - start
+
+    chars = None
+    ocr_time = None
+    if run_ocr:
+        import pytesseract
+        ocr_start = time.perf_counter()
+        chars = len(pytesseract.image_to_string(prepared))
+        ocr_time = time.perf_counter() - ocr_start
+    total_time = time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux
+    return {
+        "prep_s": prep_time,
+        "ocr_s": ocr_time,
+        "total_s": total_time,
+        "self_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "ocr_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "size": prepared.size,
+        "chars": chars,
+    }
+
+
+def measure(path, preprocess, run_ocr):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_one, args=(str(path), preprocess, run_ocr, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    if "error" in result:
+        raise RuntimeError(f"{path}: {result['error']}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing")
+    parser.add_argument("--fixtures", help="directory of .png/.jpg images (default: generate synthetic ones)")
+    parser.add_argument("--no-ocr", action="store_true", help="measure decoding and preprocessing only")
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("RAG_OCR_MAX_RSS_MB", "512")),
+                        help="memory ceiling for the preprocessed path (self and tesseract)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture_dir = args.fixtures
+        if not fixture_dir:
+            # Generate in a child too: ru_maxrss survives fork/exec, so the
+            # measuring parent must never hold a decoded image itself
+            fixture_dir = tmp
+            proc = multiprocessing.get_context("spawn").Process(target=make_fixtures, args=(tmp,))
+            proc.start()
+            proc.join()
+        paths = sorted(p for p in Path(fixture_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+        print("=" * 93)
+        print(f"{'file':<20} {'mode':<6} {'size':>11} {'prep s':>7} {'ocr s':>7} {'total s':>8} "
+              f"{'self MB':>8} {'ocr MB':>7} {'chars':>6}")
+        print("=" * 93)
+        worst = 0.0
+        ocr_times = {"raw": 0.0, "prep": 0.0}
+        for path in paths:
+            for preprocess in (False, True):
+                r = measure(path, preprocess, not args.no_ocr)
+                mode = "prep" if preprocess else "raw"
+                ocr_s = "-" if r["ocr_s"] is None else f"{r['ocr_s']:.2f}"
+                size = f"{r['size'][0]}x{r['size'][1]}"
+                print(f"{path.name:<20} {mode:<6} {size:>11} {r['prep_s']:7.2f} {ocr_s:>7} {r['total_s']:8.2f} "
+                      f"{r['self_mb']:8.1f} {r['ocr_mb']:7.1f} {str(r['chars']):>6}")
+                ocr_times[mode] += r["ocr_s"] or 0.0
+                if preprocess:
+                    worst = max(worst, r["self_mb"], r["ocr_mb"])
+
+    if not args.no_ocr and ocr_times["prep"]:
+        print(f"OCR time: raw {ocr_times['raw']:.2f}s, preprocessed {ocr_times['prep']:.2f}s "
+              f"({ocr_times['raw'] / ocr_times['prep']:.1f}x faster)")
+
+    if worst > args.max_rss_mb:
+        print(f"❌ Preprocessed OCR peaked at {worst:.1f} MB, ceiling is {args.max_rss_mb:.0f} MB")
+        sys.exit(1)
+    print(f"✅ Preprocessed OCR peaked at {worst:.1f} MB (ceiling {args.max_rss_mb:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare vector store backends: ingest time, query latency, recall and memory.
+
+Each backend runs in a fresh child process against the same seeded random corpus,
+so peak RSS (getrusage) is comparable. Recall@k is measured against exact search.
+
+Run from the rag-service directory:
+    python -m app.benchmark_vector_store --points 20000 --queries 200
+    python -m app.benchmark_vector_store --qdrant-url http://localhost:6333   # include remote Qdrant
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import tempfile
+import time
+import uuid
+
+COLLECTION = "bench_vectors"
+
+
+def _corpus(points, queries, size, seed=0):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    # Clustered data, closer to real embeddings than uniform noise
+    centers = rng.normal(size=(64, size)).astype(np.float32)
+    data = centers[rng.integers(0, 64, points)] + 0.3 * rng.normal(size=(points, size)).astype(np.float32)
+    qs = centers[rng.integers(0, 64, queries)] + 0.3 * rng.normal(size=(queries, size)).astype(np.float32)
+    return data, qs
+
+
+def _run_backend(name, options, args, queue):
+    try:
+        queue.put(_bench(name, options, args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _bench(name, options, args):
+    import numpy as np
+    from app import vector_store
+
+    data, queries = _corpus(args.points, args.queries, args.size)
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    if options["backend"] == "numpy":
+        store = vector_store.NumpyStore(options["path"], ivf_lists=options.get("ivf_lists", 0), ivf_probe=args.probe)
+    else:
+        store = vector_store.create_store(options["backend"], url=options.get("url"), path=options.get("path"))
+    store.clear(COLLECTION, args.size)
+
+    start = time.perf_counter()
+    for i in range(0, args.points, 256):
+        batch = [
+            {"id": str(uuid.UUID(int=j + 1)), "vector": data[j].tolist(),
+             "payload": {"file_path": f"doc_{j // 20}", "chunk_id": j % 20, "category_id": j % 10}}
+            for j in range(i, min(i + 256, args.points))
+        ]
+        store.upsert(COLLECTION, batch)
+    ingest_s = time.perf_counter() - start
+
+    # Exact top-k for recall
+    normed = data / np.linalg.norm(data, axis=1, keepdims=True)
+    latencies, recalls = [], []
+    for qi, q in enumerate(queries):
+        flt = {"must": [{"key": "category_id", "match": {"value": qi % 10}}]} if qi % 2 else None
+        start = time.perf_counter()
+        hits = store.search(COLLECTION, q.tolist(), limit=args.k, query_filter=flt)
+        latencies.append(time.perf_counter() - start)
+
+        scores = normed @ (q / np.linalg.norm(q))
+        if flt:
+            scores[np.arange(args.points) % 10 != qi % 10] = -np.inf
+        exact = {str(uuid.UUID(int=int(j) + 1)) for j in np.argsort(-scores)[:args.k]}
+        recalls.append(len(exact & {str(h.id) for h in hits}) / args.k)
+
+    latencies.sort()
+    return {
+        "ingest_s": ingest_s,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "recall": statistics.mean(recalls),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--size", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=64)
+    parser.add_argument("--probe", type=int, default=8)
+    parser.add_argument("--qdrant-url", help="also benchmark a remote Qdrant at this URL")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("numpy brute", {"backend": "numpy", "path": f"{tmp}/numpy"}),
+            ("numpy ivf", {"backend": "numpy", "path": f"{tmp}/ivf", "ivf_lists": args.ivf_lists}),
+            ("qdrant-local", {"backend": "qdrant-local", "path": f"{tmp}/qdrant"}),
+        ]
+        if args.qdrant_url:
+            backends.append(("qdrant remote", {"backend": "qdrant", "url": args.qdrant_url}))
+
+        print(f"{args.points} points x {args.size} dims, {args.queries} queries (half filtered), k={args.k}")
+        print("=" * 72)
+        print(f"{'backend':<15} {'ingest s':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7} {'+RSS MB':>8}")
+        print("=" * 72)
+        for name, options in backends:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_backend, args=(name, options, args, queue))
+            proc.start()
+            r = queue.get()
+            proc.join()
+            if "error" in r:
+                print(f"{name:<15} failed: {r['error']}")
+                continue
+            print(f"{name:<15} {r['ingest_s']:9.2f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+                  f"{r['recall']:7.3f} {r['rss_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Bulk ingest: many files, or zip/tar archives of files, in one request.
+
+Uploads are staged on disk, archives are expanded next to them, and the files
+are extracted, split and embedded on a thread pool. Their points are written
+through the shared client in batches of RAG_UPSERT_BATCH_SIZE points spanning
+several files, instead of one initialize/upsert round trip per file.
+The result is a per-file manifest.
+
+    RAG_BULK_INGEST_WORKERS  files processed in parallel (default min(4, CPU count))
+    RAG_BULK_MAX_FILES       files accepted per request: loose uploads plus the supported
+                             members of every archive (default 2000)
+    RAG_BULK_MAX_BYTES       bytes accepted per request: loose uploads plus the
+                             uncompressed size of those members (default 2 GiB)
+
+Both limits are tracked by one RequestLimits per request and checked before an
+archive member is written to disk.
+"""
+import contextvars
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+
+from app.ingest import SUPPORTED_EXTENSIONS, UPSERT_BATCH_SIZE, prepare_file_points, write_prepared_points
+from app.tracing import span
+from app.vector_store import VECTOR_DB
+
+BULK_WORKERS = int(os.getenv("RAG_BULK_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_FILES = int(os.getenv("RAG_BULK_MAX_FILES", "2000"))
+MAX_BYTES = int(os.getenv("RAG_BULK_MAX_BYTES", str(2 * 1024 ** 3)))
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_archive(name):
+    return str(name).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_supported(name):
+    return Path(str(name)).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+def _member_path(dest_dir, name):
+    """Where an archive member goes under dest_dir, or None if it would escape it."""
+    parts = [p for p in PurePosixPath(name.replace("\\", "/")).parts if p not in ("", ".", "/")]
+    if not parts or ".." in parts:
+        return None
+    return Path(dest_dir).joinpath(*parts)
+
+
+class RequestLimits:
+    """Files and bytes accepted so far by one bulk request."""
+
+    def __init__(self, max_files=None, max_bytes=None):
+        self.max_files = MAX_FILES if max_files is None else max_files
+        self.max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files, nbytes):
+        """Count more files; raises ValueError once the request is over a limit."""
+        self.files += files
+        self.bytes += nbytes
+        if self.files > self.max_files:
+            raise ValueError(f"Bulk request has more than {self.max_files} files")
+        if self.bytes > self.max_bytes:
+            raise ValueError(f"Bulk request is larger than {self.max_bytes} bytes")
+
+
+def expand_archive(archive_path, dest_dir, workers=BULK_WORKERS, limits=None):
+    """Extract the regular files of a zip or tar archive into dest_dir.
+
+    Returns [(disk_path, member_name), ...] in archive order. Members with an
+    unsupported extension are listed with disk_path None and not extracted.
+    Extracted members are counted against ``limits`` (a fresh RequestLimits
+    when omitted) before they are written.
+    Zip members are extracted in parallel (one handle per thread); tar archives
+    are a single compressed stream and are read sequentially.
+    """
+    limits = limits or RequestLimits()
+    if str(archive_path).lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir()]
+        wanted = [(info, _member_path(dest_dir, info.filename)) for info in members if is_supported(info.filename)]
+        wanted = [(info, target) for info, target in wanted if target is not None]
+        limits.add(len(wanted), sum(info.file_size for info, _ in wanted))
+
+        def extract(batch):
+            with zipfile.ZipFile(archive_path) as zf:
+                for info, target in batch:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    with zf.open(info) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        n = max(1, min(workers, len(wanted)))
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            for f in [pool.submit(extract, wanted[i::n]) for i in range(n)]:
+                f.result()
+        extracted = {info.filename: target for info, target in wanted}
+        return [(extracted.get(info.filename), info.filename) for info in members]
+
+    out = []
+    with tarfile.open(archive_path, "r:*") as tf:
+        for member in tf:
+            if not member.isfile():
+                continue
+            target = _member_path(dest_dir, member.name)
+            if target is None or not is_supported(member.name):
+                out.append((None, member.name))
+                continue
+            limits.add(1, member.size)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with tf.extractfile(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            out.append((target, member.name))
+    return out
+
+
+def _prepare(disk_path, source_path, embedding_model, collection_name, category_id):
+    with span("ingest", file_path=source_path, category_id=category_id, backend=VECTOR_DB) as s:
+        try:
+            prepared = prepare_file_points(disk_path, embedding_model, collection_name, category_id, source_path)
+        except Exception as e:
+            prepared = {"error": f"Error processing {source_path}: {str(e)}"}
+        if "error" in prepared:
+            s.set_attribute("error", prepared["error"])
+            print(prepared["error"])
+        return prepared
+
+
+def bulk_ingest(sources, client, embedding_model, collection_name="file_vectors", category_id=None,
+                workers=BULK_WORKERS):
+    """Ingest [(disk_path, source_path), ...] and return a per-file manifest.
+
+    ``source_path`` is what gets recorded in the payload; a ``disk_path`` of None
+    or an unsupported extension marks the entry as skipped.
+    """
+    start = time.perf_counter()
+    manifest = [{"file_path": str(src), "status": "skipped"} for _, src in sources]
+    pending = []
+
+    def flush():
+        if not pending:
+            return
+        try:
+            write_prepared_points(client, collection_name, [prepared for _, prepared in pending])
+            for i, prepared in pending:
+                manifest[i].update(status="ingested", chunks=prepared["chunks"])
+        except Exception as e:
+            for i, _ in pending:
+                manifest[i].update(status="failed", error=f"Error storing points: {str(e)}")
+        pending.clear()
+
+    with span("ingest.bulk", files=len(sources), category_id=category_id, backend=VECTOR_DB) as bulk_span:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {}
+            for i, (disk_path, src) in enumerate(sources):
+                if disk_path is None or not is_supported(disk_path):
+                    if is_supported(src):
+                        manifest[i]["error"] = "Archive member path escapes the archive root"
+                    else:
+                        manifest[i]["error"] = f"Unsupported file type: {Path(str(src)).suffix.lower() or src}"
+                    continue
+                ctx = contextvars.copy_context()
+                futures[pool.submit(ctx.run, _prepare, disk_path, str(src), embedding_model,
+                                    collection_name, category_id)] = i
+
+            for future in as_completed(futures):
+                i = futures[future]
+                prepared = future.result()
+                if "error" in prepared:
+                    manifest[i].update(status="failed", error=prepared["error"])
+                    continue
+                pending.append((i, prepared))
+                if sum(p["chunks"] for _, p in pending) >= UPSERT_BATCH_SIZE:
+                    flush()
+            flush()
+
+        counts = {status: sum(1 for m in manifest if m["status"] == status)
+                  for status in ("ingested", "failed", "skipped")}
+        chunks = sum(m.get("chunks", 0) for m in manifest)
+        bulk_span.set_attributes(chunks=chunks, **counts)
+
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    message = f"Ingested {counts['ingested']} of {len(sources)} files ({chunks} chunks) in {elapsed_ms} ms"
+    print(message)
+    return {
+        "message": message,
+        "total_files": len(sources),
+        **counts,
+        "chunks": chunks,
+        "category_id": category_id,
+        "elapsed_ms": elapsed_ms,
+        "files": manifest,
+    }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Learn per-category score thresholds from logged queries.
+
+Reads query logs (JSONL, optionally gzip-compressed; one object per line with
+"question" and "category_id"), re-runs every question against the vector store
+without a threshold and finds the knee of its score curve with
+rerank.score_gap_cutoff. Per category, the threshold is a low quantile of the
+knee scores. It is capped at a low quantile of the top-1 scores, so that almost
+every query keeps at least its best hit. Categories with fewer than
+--min-queries knees use the default learned from all queries.
+
+The result is written to RAG_SCORE_THRESHOLDS_FILE (or --output), which the
+service re-reads when it changes:
+
+    {"default": 0.41, "categories": {"5": 0.52}, "queries": {"5": 130, ...}, ...}
+
+Records without question text (hashed logs) are skipped.
+
+Run from the rag-service directory:
+    python -m app.calibrate_thresholds query_logs/*.jsonl.gz
+    python -m app.calibrate_thresholds queries.jsonl --quantile 0.2 --output /tmp/thresholds.json
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+
+from app import rerank, search
+
+
+def read_queries(paths):
+    """Yield (question, category_id) from JSONL query logs."""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("question"):
+                    yield record["question"], record.get("category_id")
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def calibrate(queries, limit=20, q=0.1, top1_q=0.05, min_queries=20):
+    """Return the thresholds document for an iterable of (question, category_id)."""
+    knees = defaultdict(list)
+    top1 = defaultdict(list)
+    counts = defaultdict(int)
+    for question, category_id in queries:
+        hits, _ = search.search_hits(question, limit, category_id=category_id)
+        if not hits:
+            continue
+        key = "null" if category_id is None else str(category_id)
+        counts[key] += 1
+        top1[key].append(hits[0].score)
+        _, cut_score = rerank.score_gap_cutoff([{"score": h.score} for h in hits])
+        if cut_score is not None:
+            knees[key].append(cut_score)
+
+    def threshold(knee_scores, best_scores):
+        return round(min(quantile(knee_scores, q), quantile(best_scores, top1_q)), 4)
+
+    all_knees = [s for scores in knees.values() for s in scores]
+    all_top1 = [s for scores in top1.values() for s in scores]
+    doc = {
+        "categories": {
+            key: threshold(knees[key], top1[key])
+            for key in knees if len(knees[key]) >= min_queries and key != "null"
+        },
+        "queries": dict(counts),
+        "knees": {key: len(scores) for key, scores in knees.items()},
+        "quantile": q,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    if len(all_knees) >= min_queries:
+        doc["default"] = threshold(all_knees, all_top1)
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="query log files (.jsonl or .jsonl.gz)")
+    parser.add_argument("--limit", type=int, default=20, help="hits fetched per query")
+    parser.add_argument("--quantile", type=float, default=0.1, help="quantile of knee scores used as threshold")
+    parser.add_argument("--min-queries", type=int, default=20, help="knees needed before a category gets its own threshold")
+    parser.add_argument("--output", default=search.SCORE_THRESHOLDS_FILE)
+    args = parser.parse_args()
+
+    doc = calibrate(read_queries(args.logs), limit=args.limit, q=args.quantile, min_queries=args.min_queries)
+    if "default" not in doc and not doc["categories"]:
+        print(f"Not enough queries with a clear score knee to calibrate ({sum(doc['knees'].values())} found)")
+        return
+
+    # Write atomically: the service may be reading the file
+    tmp = f"{args.output}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp, args.output)
+    print(f"Wrote {args.output}: default={doc.get('default')}, {len(doc['categories'])} categories")
+    for key, value in sorted(doc["categories"].items()):
+        print(f"  category {key}: {value} ({doc['knees'][key]} of {doc['queries'][key]} queries had a knee)")
+
+
+if __name__ == "__main__":
+    main()
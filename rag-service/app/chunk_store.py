@@ -0,0 +1,152 @@
+"""Local compressed store for chunk text, kept out of the vector payload.
+
+With RAG_CHUNK_STORE=sqlite, ingest writes each chunk's text (zlib-compressed)
+to a SQLite file keyed by point ID, and the vector point only carries
+{"doc_id", "chunk_id", "content_length", "category_id"}. ``doc_id`` is a small
+integer standing in for the file path, which is stored once per document.
+Search results are hydrated with text and file path in one batched lookup,
+after the final top-k is known.
+
+Unset (default), chunk text and file_path stay in the payload as before.
+
+    RAG_CHUNK_STORE       "" (inline payload) or "sqlite"
+    RAG_CHUNK_STORE_PATH  directory holding one <collection>.sqlite file (default ./chunk_store)
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+
+CHUNK_STORE = os.getenv("RAG_CHUNK_STORE", "").lower()
+CHUNK_STORE_PATH = os.getenv("RAG_CHUNK_STORE_PATH", "./chunk_store")
+
+# SQLite caps bound parameters per statement (999 on older builds)
+_BATCH = 500
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def enabled():
+    return CHUNK_STORE == "sqlite"
+
+
+def get_chunk_store(collection_name="file_vectors"):
+    with _stores_lock:
+        store = _stores.get(collection_name)
+        if store is None:
+            store = ChunkStore(Path(CHUNK_STORE_PATH) / f"{collection_name}.sqlite")
+            _stores[collection_name] = store
+        return store
+
+
+class ChunkStore:
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_path TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                point_id TEXT PRIMARY KEY,
+                doc_id INTEGER NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                char_start INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS chunks_by_doc ON chunks (doc_id, chunk_id);
+        """)
+        # Stores created before chunks carried offsets
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "char_start" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN char_start INTEGER")
+        self._conn.commit()
+
+    def document_id(self, file_path, create=False):
+        with self._lock:
+            row = self._conn.execute("SELECT doc_id FROM documents WHERE file_path = ?", (file_path,)).fetchone()
+            if row or not create:
+                return row[0] if row else None
+            cur = self._conn.execute("INSERT INTO documents (file_path) VALUES (?)", (file_path,))
+            self._conn.commit()
+            return cur.lastrowid
+
+    def document_paths(self, doc_ids=None):
+        """Map doc_id -> file_path (all documents when doc_ids is None)."""
+        with self._lock:
+            if doc_ids is None:
+                return dict(self._conn.execute("SELECT doc_id, file_path FROM documents"))
+            ids = list(set(doc_ids))
+            out = {}
+            for i in range(0, len(ids), _BATCH):
+                batch = ids[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                out.update(self._conn.execute(
+                    f"SELECT doc_id, file_path FROM documents WHERE doc_id IN ({marks})", batch))
+            return out
+
+    def put_chunks(self, doc_id, rows):
+        """Store [(point_id, chunk_id, text, char_start), ...] for one document."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (point_id, doc_id, chunk_id, text, char_start) VALUES (?, ?, ?, ?, ?)",
+                [(pid, doc_id, cid, zlib.compress(text.encode("utf-8"), 6), start) for pid, cid, text, start in rows],
+            )
+            self._conn.commit()
+
+    def get_chunks(self, point_ids):
+        """Batched lookup: point_id -> (text, char_start) for the IDs that exist."""
+        ids = list(set(point_ids))
+        out = {}
+        with self._lock:
+            for i in range(0, len(ids), _BATCH):
+                batch = ids[i:i + _BATCH]
+                marks = ",".join("?" * len(batch))
+                for pid, blob, start in self._conn.execute(
+                        f"SELECT point_id, text, char_start FROM chunks WHERE point_id IN ({marks})", batch):
+                    out[pid] = (zlib.decompress(blob).decode("utf-8"), start)
+        return out
+
+    def get_range(self, doc_id, chunk_start, chunk_end):
+        """[(text, char_start), ...] of chunks chunk_start..chunk_end of one document, in chunk order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, char_start FROM chunks WHERE doc_id = ? AND chunk_id BETWEEN ? AND ? ORDER BY chunk_id",
+                (doc_id, chunk_start, chunk_end)).fetchall()
+        return [(zlib.decompress(blob).decode("utf-8"), start) for blob, start in rows]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM documents")
+            self._conn.commit()
+
+
+def hydrate(candidates, collection_name="file_vectors"):
+    """Fill payload content and file_path for candidates whose text lives in the store.
+
+    Merged spans are rebuilt from their member chunks with the overlap removed,
+    using the chunks' character offsets.
+    Candidates that already carry content (inline payloads) are left untouched.
+    """
+    from app.rerank import join_chunks
+
+    pending = [c for c in candidates if "content" not in c["payload"] and "doc_id" in c["payload"]]
+    if not pending:
+        return candidates
+
+    store = get_chunk_store(collection_name)
+    chunks = store.get_chunks(pid for c in pending for pid in c.get("member_ids", [c["id"]]))
+    paths = store.document_paths(c["payload"]["doc_id"] for c in pending)
+    for c in pending:
+        content = join_chunks(chunks.get(pid, ("", None)) for pid in c.get("member_ids", [c["id"]]))
+        c["payload"]["content"] = content
+        c["payload"]["content_length"] = len(content)
+        c["payload"].setdefault("file_path", paths.get(c["payload"]["doc_id"], ""))
+    return candidates
@@ -0,0 +1,44 @@
+"""Dedicated thread pools for blocking work called from async handlers.
+
+The vector store clients (Qdrant HTTP, embedded Qdrant, NumPy) are synchronous.
+Calling them directly inside ``async def`` handlers blocks the event loop, so
+each worker serves one request at a time. Handlers instead await
+``run_db(fn, ...)`` for store calls and ``run_ingest(fn, ...)`` for parsing and
+ingest, which get separate pools so a burst of uploads cannot starve queries.
+
+    RAG_DB_THREADS      threads for vector store calls (default 32)
+    RAG_INGEST_THREADS  threads for extraction / ingest (default 2)
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DB_THREADS = int(os.getenv("RAG_DB_THREADS", "32"))
+INGEST_THREADS = int(os.getenv("RAG_INGEST_THREADS", "2"))
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="vector-db")
+_ingest_executor = ThreadPoolExecutor(max_workers=INGEST_THREADS, thread_name_prefix="ingest")
+
+
+async def _run(executor, fn, *args, **kwargs):
+    # Carry context variables (e.g. the active tracing span) into the thread
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking vector store call on the database pool."""
+    return await _run(_db_executor, fn, *args, **kwargs)
+
+
+async def run_ingest(fn, *args, **kwargs):
+    """Run blocking extraction / ingest work on the ingest pool."""
+    return await _run(_ingest_executor, fn, *args, **kwargs)
+
+
+def shutdown(wait=True):
+    _db_executor.shutdown(wait=wait)
+    _ingest_executor.shutdown(wait=wait)
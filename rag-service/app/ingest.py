@@ -1,14 +1,26 @@
+import bisect
 import os
+import threading
 import uuid
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as qmodels
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from PyPDF2 import PdfReader
-from PIL import Image
-import pytesseract
-import docx
-import numpy as np
 from pathlib import Path
+from app.vector_store import create_store, VECTOR_SIZE, VECTOR_DB
+from app.tracing import span
+from app import chunk_store
+
+# The vector backend, the parsers (PyPDF2, pdfminer, PIL/pytesseract, python-docx)
+# and the langchain splitter are imported inside the functions that use them, so
+# importing this module, and therefore booting a worker, stays cheap.
+
+# Page boundaries in extracted text. PDF extractors end every page with a form
+# feed; split_pages turns them into PAGE_JOIN and records where each page starts.
+PAGE_BREAK = "\f"
+PAGE_JOIN = "\n\n"
+
+# File types extract_content can handle
+SUPPORTED_EXTENSIONS = {'.txt', '.pdf', '.docx', '.png', '.jpg', '.jpeg'}
+
+# Points per upsert request when storing prepared files
+UPSERT_BATCH_SIZE = int(os.getenv("RAG_UPSERT_BATCH_SIZE", "512"))
 
 # Simple embedding function using basic text features
 def simple_text_embedding(text, vector_size=384):
@@ -38,47 +50,74 @@ def simple_text_embedding(text, vector_size=384):
 
     return features
 
-# Initialize Qdrant client and embeddings model
+# Shared vector store (see app.vector_store; backend chosen by VECTOR_DB):
+# one client / connection pool per process instead of one per request
+_client = None
+_ready_collections = set()
+# Request threads, the warm-up and agent tools all reach these at once; the
+# embedded stores must be opened once per process, and two ensure_collection
+# calls would race on creating the collection
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_store()
+    return _client
+
+# Initialize vector store and embeddings model
 def initialize_vector_db(collection_name="file_vectors"):
-    client = QdrantClient(host="qdrant", port=6333)
-    try:
-        client.get_collection(collection_name)
-    except:
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=qmodels.VectorParams(size=384, distance=qmodels.Distance.COSINE)
-        )
+    client = get_client()
+    if collection_name not in _ready_collections:
+        with _client_lock:
+            if collection_name not in _ready_collections:
+                client.ensure_collection(collection_name, VECTOR_SIZE)
+                _ready_collections.add(collection_name)
 
     # Use simple embedding function
     embedding_model = simple_text_embedding
-    print("Using simple text embedding (no external dependencies)")
 
-    return client, embedding_model# Text extraction functions for different file types
+    return client, embedding_model
+
+# Text extraction functions for different file types
 def extract_text_from_txt(file_path):
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
 def extract_text_from_pdf(file_path):
     """Enhanced PDF text extraction with multiple fallback methods"""
+    with span("pdf.extract", file_path=str(file_path)) as pdf_span:
+        text = _extract_text_from_pdf(file_path, pdf_span)
+        pdf_span.set_attribute("chars", len(text))
+        return text
+
+def _extract_text_from_pdf(file_path, pdf_span):
     text = ""
 
     # Method 1: Try PyPDF2 (most reliable, always available)
     try:
-        from PyPDF2 import PdfReader
-        print(f"Extracting PDF using PyPDF2: {file_path}")
-
-        with open(file_path, 'rb') as file:
-            reader = PdfReader(file)
-            print(f"PDF has {len(reader.pages)} pages")
-
-            for i, page in enumerate(reader.pages):
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
-                if i < 3:  # Log first few pages
-                    print(f"Page {i+1}: {len(page_text)} characters extracted")
+        with span("pdf.pypdf2") as s:
+            from PyPDF2 import PdfReader
+            print(f"Extracting PDF using PyPDF2: {file_path}")
+
+            with open(file_path, 'rb') as file:
+                reader = PdfReader(file)
+                print(f"PDF has {len(reader.pages)} pages")
+                s.set_attribute("pages", len(reader.pages))
+                pdf_span.set_attribute("pages", len(reader.pages))
+
+                for i, page in enumerate(reader.pages):
+                    page_text = page.extract_text() or ""
+                    text += page_text + PAGE_BREAK
+                    if i < 3:  # Log first few pages
+                        print(f"Page {i+1}: {len(page_text)} characters extracted")
+            s.set_attribute("chars", len(text))
 
         if len(text.strip()) > 100:  # If we got substantial text, use it
             print(f"Successfully extracted {len(text)} characters using PyPDF2")
+            pdf_span.set_attribute("method", "pypdf2")
             return clean_extracted_text(text)
 
     except Exception as e:
@@ -86,12 +125,16 @@ def extract_text_from_pdf(file_path):
 
     # Method 2: Try pdfminer.six (better text extraction)
     try:
-        from pdfminer.high_level import extract_text as pdfminer_extract
-        print("Trying pdfminer.six for better extraction")
+        with span("pdf.pdfminer") as s:
+            from pdfminer.high_level import extract_text as pdfminer_extract
+            print("Trying pdfminer.six for better extraction")
 
-        text = pdfminer_extract(file_path)
+            # pdfminer already ends every page with a form feed
+            text = pdfminer_extract(file_path)
+            s.set_attribute("chars", len(text))
         if len(text.strip()) > 100:
             print(f"Successfully extracted {len(text)} characters using pdfminer")
+            pdf_span.set_attribute("method", "pdfminer")
             return clean_extracted_text(text)
 
     except Exception as e:
@@ -99,21 +142,25 @@ def extract_text_from_pdf(file_path):
 
     # Method 3: Try PyMuPDF if available
     try:
-        import fitz
-        print("Trying PyMuPDF for extraction")
+        with span("pdf.pymupdf") as s:
+            import fitz
+            print("Trying PyMuPDF for extraction")
 
-        doc = fitz.open(file_path)
-        text = ""
+            doc = fitz.open(file_path)
+            text = ""
 
-        for page_num in range(min(len(doc), 20)):  # Limit to first 20 pages
-            page = doc.load_page(page_num)
-            page_text = page.get_text()
-            text += page_text + "\n"
+            pages = min(len(doc), 20)  # Limit to first 20 pages
+            for page_num in range(pages):
+                page = doc.load_page(page_num)
+                page_text = page.get_text()
+                text += page_text + PAGE_BREAK
 
-        doc.close()
+            doc.close()
+            s.set_attributes(pages=pages, chars=len(text))
 
         if len(text.strip()) > 100:
             print(f"Successfully extracted {len(text)} characters using PyMuPDF")
+            pdf_span.set_attribute("method", "pymupdf")
             return clean_extracted_text(text)
 
     except Exception as e:
@@ -121,23 +168,25 @@ def extract_text_from_pdf(file_path):
 
     # Method 4: OCR fallback for image-based PDFs
     try:
-        from PIL import Image
         import pytesseract
         print("Attempting OCR extraction")
 
         # Convert PDF pages to images and OCR
         try:
             from pdf2image import convert_from_path
-            images = convert_from_path(file_path, dpi=300, first_page=1, last_page=10)  # First 10 pages
+            with span("pdf.ocr") as s:
+                images = convert_from_path(file_path, dpi=300, first_page=1, last_page=10)  # First 10 pages
 
-            text = ""
-            for i, image in enumerate(images):
-                page_text = pytesseract.image_to_string(image)
-                text += page_text + "\n"
-                print(f"OCR Page {i+1}: {len(page_text)} characters")
+                text = ""
+                for i, image in enumerate(images):
+                    page_text = pytesseract.image_to_string(preprocess_image_for_ocr(image))
+                    text += page_text + PAGE_BREAK
+                    print(f"OCR Page {i+1}: {len(page_text)} characters")
+                s.set_attributes(pages=len(images), chars=len(text))
 
             if len(text.strip()) > 50:
                 print(f"Successfully extracted {len(text)} characters using OCR")
+                pdf_span.set_attribute("method", "ocr")
                 return clean_extracted_text(text)
 
         except ImportError:
@@ -147,6 +196,7 @@ def extract_text_from_pdf(file_path):
         print(f"OCR extraction failed: {e}")
 
     # Final fallback: return whatever we got
+    pdf_span.set_attribute("method", "none")
     if len(text.strip()) < 10:
         print(f"WARNING: Very little text extracted from {file_path} ({len(text)} characters)")
         return "PDF content could not be extracted properly. The document may be image-based or corrupted."
@@ -154,7 +204,18 @@ def extract_text_from_pdf(file_path):
     return clean_extracted_text(text)
 
 def clean_extracted_text(text):
-    """Clean and normalize extracted text"""
+    """Clean and normalize extracted text
+
+    Page breaks (PAGE_BREAK) are kept: each page is cleaned on its own so that
+    text never moves across a page boundary.
+    """
+    if not text:
+        return ""
+    if PAGE_BREAK in text:
+        return PAGE_BREAK.join(_clean_page_text(page) for page in text.split(PAGE_BREAK))
+    return _clean_page_text(text)
+
+def _clean_page_text(text):
     import re
 
     if not text:
@@ -183,14 +244,160 @@ def clean_extracted_text(text):
 
     return text.strip()
 
-def extract_text_from_docx(file_path):
+def iter_docx_blocks(file_path):
+    """Yield the body of a DOCX file in document order, keeping its structure.
+
+    Each block is a dict: {"type": "heading", "level": n, "text": ...},
+    {"type": "paragraph", "text": ...} or {"type": "table", "rows": [[cell, ...], ...], "text": ...}.
+    Empty paragraphs are skipped; merged table cells are emitted once per row.
+    """
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
     doc = docx.Document(file_path)
-    return " ".join([para.text for para in doc.paragraphs])
+    for element in doc.element.body.iterchildren():
+        tag = element.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            para = Paragraph(element, doc)
+            text = para.text.strip()
+            if not text:
+                continue
+            style = para.style.name if para.style is not None else ""
+            if style.startswith("Heading") or style == "Title":
+                level_str = style[len("Heading"):].strip()
+                level = int(level_str) if level_str.isdigit() else 1
+                yield {"type": "heading", "level": level, "text": text}
+            else:
+                yield {"type": "paragraph", "text": text}
+        elif tag == 'tbl':
+            rows = []
+            for row in Table(element, doc).rows:
+                cells = []
+                previous = None
+                for cell in row.cells:
+                    # A horizontally merged cell repeats the same <w:tc> once per grid column
+                    if previous is not None and cell._tc is previous._tc:
+                        continue
+                    previous = cell
+                    cells.append(cell.text.strip())
+                if any(cells):
+                    rows.append(cells)
+            if rows:
+                yield {"type": "table", "rows": rows, "text": "\n".join(" | ".join(r) for r in rows)}
+
+def extract_text_from_docx(file_path):
+    """Flatten DOCX blocks into text separated by blank lines, so the splitter
+    breaks chunks on paragraph, heading and table boundaries first."""
+    parts = []
+    for block in iter_docx_blocks(file_path):
+        if block["type"] == "heading":
+            parts.append("#" * block["level"] + " " + block["text"])
+        else:
+            parts.append(block["text"])
+    return "\n\n".join(parts)
+
+# OCR preprocessing settings
+OCR_TARGET_DPI = int(os.getenv("RAG_OCR_TARGET_DPI", "300"))
+OCR_MAX_SIDE = int(os.getenv("RAG_OCR_MAX_SIDE", "3500"))  # ~A4 at 300 DPI
+OCR_DESKEW = os.getenv("RAG_OCR_DESKEW", "true").lower() in ("1", "true", "yes")
+# Height in pixels of a text line (ascender to descender) that tesseract still
+# reads reliably; larger text is scaled down to it. 0 disables. Phone photos
+# carry no useful DPI (72 or none), so this, not EXIF DPI, sizes them.
+OCR_TEXT_HEIGHT = int(os.getenv("RAG_OCR_TEXT_HEIGHT", "40"))
+
+def _estimate_skew(gray, max_angle=5.0, step=0.5, min_gain=0.1):
+    """Estimate small text skew (degrees) from the row ink profile of a thumbnail.
+
+    When text lines are horizontal the per-row ink counts alternate sharply
+    between lines and gaps, so the angle with the highest variance wins. The
+    page is taken as straight (0) unless an angle beats it by ``min_gain``, and
+    when the thumbnail has no ink at all (blank page, text lost in downscaling).
+    """
+    import numpy as np
+
+    small = gray.copy()
+    small.thumbnail((800, 800))
+
+    def row_ink(angle):
+        rotated = small.rotate(angle, fillcolor=255) if angle else small
+        return (np.asarray(rotated) < 128).sum(axis=1)
+
+    ink = row_ink(0.0)
+    if not ink.any():
+        return 0.0
+    straight = float(ink.var())
+    best_angle, best_score = 0.0, straight
+    steps = int(round(max_angle / step))
+    for i in range(-steps, steps + 1):
+        if i == 0:
+            continue
+        score = float(row_ink(i * step).var())
+        if score > best_score:
+            best_angle, best_score = i * step, score
+    if best_score <= straight * (1 + min_gain):
+        return 0.0
+    return best_angle
+
+def _estimate_text_height(gray, strip_width=256, min_lines=5):
+    """Median height in pixels of the text lines of a page, or None if too few are found.
+
+    Lines are the runs of rows holding ink, measured in narrow vertical strips
+    so that a small skew does not smear neighbouring lines together.
+    """
+    import numpy as np
+
+    ink = np.asarray(gray) < 128
+    heights = []
+    for x in range(0, ink.shape[1], strip_width):
+        rows = np.concatenate(([False], ink[:, x:x + strip_width].any(axis=1), [False]))
+        edges = np.flatnonzero(rows[1:] != rows[:-1])
+        runs = edges[1::2] - edges[::2]
+        # Single-row runs are specks and rules, not text
+        heights.extend(runs[runs > 2].tolist())
+    if len(heights) < min_lines:
+        return None
+    return float(np.median(heights))
+
+def preprocess_image_for_ocr(image, target_dpi=OCR_TARGET_DPI, max_side=OCR_MAX_SIDE, deskew=OCR_DESKEW,
+                             text_height=OCR_TEXT_HEIGHT):
+    """Downscale to the target DPI (capped at max_side pixels), convert to
+    grayscale, shrink large text to about ``text_height`` pixels per line and
+    correct small skew before handing the image to tesseract."""
+    from PIL import Image
+
+    dpi = image.info.get("dpi", (0, 0))[0] or 0
+    scale = min(1.0, max_side / max(image.size))
+    if dpi > target_dpi:
+        scale = min(scale, target_dpi / dpi)
+    target_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+
+    if scale < 1.0:
+        # For JPEGs, draft() decodes at a reduced scale (1/2, 1/4, 1/8) so the
+        # full-resolution bitmap is never materialised in memory
+        image.draft("L", target_size)
+    gray = image.convert("L")
+    if gray.size != target_size and scale < 1.0:
+        gray = gray.resize(target_size, Image.LANCZOS)
+
+    if text_height:
+        line_height = _estimate_text_height(gray)
+        if line_height and line_height > text_height:
+            factor = text_height / line_height
+            gray = gray.resize((max(1, int(gray.width * factor)), max(1, int(gray.height * factor))), Image.LANCZOS)
+
+    if deskew:
+        angle = _estimate_skew(gray)
+        if angle:
+            gray = gray.rotate(angle, expand=True, fillcolor=255)
+    return gray
 
 def extract_text_from_image(file_path):
-    image = Image.open(file_path)
-    text = pytesseract.image_to_string(image)
-    return text
+    from PIL import Image
+    import pytesseract
+    with Image.open(file_path) as image:
+        prepared = preprocess_image_for_ocr(image)
+    return pytesseract.image_to_string(prepared)
 
 # File type handler
 def extract_content(file_path):
@@ -206,100 +413,200 @@ def extract_content(file_path):
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
+def split_pages(text):
+    """Join PAGE_BREAK-separated pages into one text for chunking.
+
+    Returns ``(text, page_starts)`` where page_starts[i] is the character offset
+    at which page i + 1 begins, or ``(text, None)`` when the text has no pages.
+    """
+    if PAGE_BREAK not in text:
+        return text, None
+    pages = text.split(PAGE_BREAK)
+    if len(pages) > 1 and not pages[-1].strip():
+        pages.pop()  # the break after the last page
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page) + len(PAGE_JOIN)
+    return PAGE_JOIN.join(pages), page_starts
+
+def page_at(page_starts, offset):
+    """1-based page number containing a character offset."""
+    return max(1, bisect.bisect_right(page_starts, offset))
+
 # Split text into chunks for processing
-def split_text(text, chunk_size=1000, chunk_overlap=200):
+def split_text(text, chunk_size=1000, chunk_overlap=200, with_offsets=False):
+    """Split text into overlapping chunks.
+
+    With ``with_offsets=True`` returns ``[(chunk, char_start), ...]`` where
+    char_start is the chunk's offset in ``text``.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        length_function=len
+        length_function=len,
+        add_start_index=with_offsets
     )
-    return text_splitter.split_text(text)
+    if not with_offsets:
+        return text_splitter.split_text(text)
+    return [(doc.page_content, doc.metadata["start_index"]) for doc in text_splitter.create_documents([text])]
 
 # Ingest file into vector database
-def ingest_file_to_vector_db(file_path, client, embedding_model, collection_name="file_vectors", category_id=None):
-    try:
-        print(f"Starting ingestion of: {file_path}")
-        if category_id:
-            print(f"Category ID: {category_id}")
+def ingest_file_to_vector_db(file_path, client, embedding_model, collection_name="file_vectors", category_id=None,
+                             source_path=None):
+    """Extract, split, embed and store one file.
 
-        # Extract content based on file type
-        content = extract_content(file_path)
-        print(f"Extracted content length: {len(content)} characters")
+    ``source_path`` is the path recorded in the payload (defaults to ``file_path``),
+    for callers that stage the file somewhere else on disk.
+    """
+    source_path = str(source_path or file_path)
+    with span("ingest", file_path=source_path, category_id=category_id, backend=VECTOR_DB) as ingest_span:
+        result = _ingest_file_to_vector_db(file_path, client, embedding_model, collection_name, category_id,
+                                           source_path)
+        if "error" in result:
+            ingest_span.set_attribute("error", result["error"])
+        return result
+
+def _ingest_file_to_vector_db(file_path, client, embedding_model, collection_name, category_id, source_path):
+    try:
+        prepared = prepare_file_points(file_path, embedding_model, collection_name, category_id, source_path)
+        if "error" in prepared:
+            return prepared
+        write_prepared_points(client, collection_name, [prepared])
 
-        if len(content.strip()) < 50:
-            return {"error": f"Extracted content too short ({len(content)} chars). File may be empty or extraction failed."}
+        result_message = f"Successfully ingested {source_path} into vector database with {prepared['chunks']} chunks"
+        if category_id:
+            result_message += f" (Category: {category_id})"
 
-        # Show preview of extracted content
-        preview = content[:500] + "..." if len(content) > 500 else content
-        print(f"Content preview: {preview}")
+        print(result_message)
+        return {"message": result_message, "chunks": prepared["chunks"], "category_id": category_id}
 
-        # Split content into chunks
-        chunks = split_text(content)
-        print(f"Split into {len(chunks)} chunks")
+    except Exception as e:
+        error_msg = f"Error processing {source_path}: {str(e)}"
+        print(error_msg)
+        return {"error": error_msg}
 
-        # Show chunk sizes
-        for i, chunk in enumerate(chunks[:3]):  # Show first 3 chunks
-            print(f"Chunk {i}: {len(chunk)} characters")
+def prepare_file_points(file_path, embedding_model, collection_name="file_vectors", category_id=None,
+                        source_path=None):
+    """Extract, split and embed one file without writing anything to the vector store.
 
-        # Generate embeddings using simple function
-        print("Generating embeddings...")
+    Returns {"file_path", "points", "texts", "doc_id", "chunks"} or {"error": ...};
+    pass the result to write_prepared_points.
+    """
+    source_path = str(source_path or file_path)
+    print(f"Starting ingestion of: {source_path}")
+    if category_id:
+        print(f"Category ID: {category_id}")
+
+    # Extract content based on file type
+    with span("ingest.extract", file_type=Path(file_path).suffix.lower()) as s:
+        s.set_attribute("bytes", os.path.getsize(file_path))
+        content = extract_content(file_path)
+        s.set_attribute("chars", len(content))
+    print(f"Extracted content length: {len(content)} characters")
+
+    if len(content.strip()) < 50:
+        return {"error": f"Extracted content too short ({len(content)} chars). File may be empty or extraction failed."}
+
+    # Show preview of extracted content
+    preview = content[:500] + "..." if len(content) > 500 else content
+    print(f"Content preview: {preview}")
+
+    # Split content into chunks, keeping each chunk's character offset and,
+    # for paged documents (PDF), the pages it spans
+    content, page_starts = split_pages(content)
+    with span("ingest.split", chars=len(content), pages=len(page_starts or ())) as s:
+        chunks_with_offsets = split_text(content, with_offsets=True)
+        chunks = [chunk for chunk, _ in chunks_with_offsets]
+        s.set_attribute("chunks", len(chunks))
+    print(f"Split into {len(chunks)} chunks")
+
+    # Show chunk sizes
+    for i, chunk in enumerate(chunks[:3]):  # Show first 3 chunks
+        print(f"Chunk {i}: {len(chunk)} characters")
+
+    # Generate embeddings using simple function
+    print("Generating embeddings...")
+    with span("ingest.embed", chunks=len(chunks)):
         vectors = [embedding_model(chunk) for chunk in chunks]
 
-        # Store in Qdrant
-        points = []
-        for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
-            point_id = str(uuid.uuid4())
+    # With a chunk store the text (and the file path, replaced by a small
+    # doc_id) stays out of the point payload.
+    use_chunk_store = chunk_store.enabled()
+    doc_id = None
+    if use_chunk_store:
+        doc_id = chunk_store.get_chunk_store(collection_name).document_id(source_path, create=True)
+    points = []
+    for i, ((chunk, char_start), vector) in enumerate(zip(chunks_with_offsets, vectors)):
+        point_id = str(uuid.uuid4())
+        if use_chunk_store:
             payload = {
-                "file_path": str(file_path),
+                "doc_id": doc_id,
+                "chunk_id": i,
+                "content_length": len(chunk)
+            }
+        else:
+            payload = {
+                "file_path": source_path,
                 "chunk_id": i,
                 "content": chunk,
                 "content_length": len(chunk)
             }
 
-            # Add category_id to payload if provided. Coerce numeric-looking IDs to int
-            if category_id is not None:
-                try:
-                    if isinstance(category_id, str) and category_id.isdigit():
-                        payload["category_id"] = int(category_id)
-                    else:
-                        payload["category_id"] = category_id
-                except Exception:
+        # Citation metadata: offsets into the extracted document text, and pages
+        payload["char_start"] = char_start
+        payload["char_end"] = char_start + len(chunk)
+        if page_starts:
+            payload["page_start"] = page_at(page_starts, char_start)
+            payload["page_end"] = page_at(page_starts, max(char_start, char_start + len(chunk) - 1))
+
+        # Add category_id to payload if provided. Coerce numeric-looking IDs to int
+        if category_id is not None:
+            try:
+                if isinstance(category_id, str) and category_id.isdigit():
+                    payload["category_id"] = int(category_id)
+                else:
                     payload["category_id"] = category_id
+            except Exception:
+                payload["category_id"] = category_id
 
-            points.append(qmodels.PointStruct(id=point_id, vector=vector, payload=payload))
+        points.append({"id": point_id, "vector": vector, "payload": payload})
 
-        # Debug: print a preview of the first payload to help with matching issues
-        if len(points) > 0:
-            print(f"First payload preview: {points[0].payload}")
-        print(f"Storing {len(points)} points in vector database...")
-        client.upsert(collection_name=collection_name, points=points)
-
-        result_message = f"Successfully ingested {file_path} into vector database with {len(chunks)} chunks"
-        if category_id:
-            result_message += f" (Category: {category_id})"
+    # Debug: print a preview of the first payload to help with matching issues
+    if len(points) > 0:
+        print(f"First payload preview: {points[0]['payload']}")
+    return {"file_path": source_path, "points": points, "texts": chunks, "doc_id": doc_id, "chunks": len(chunks)}
 
-        print(result_message)
-        return {"message": result_message, "chunks": len(chunks), "category_id": category_id}
+def write_prepared_points(client, collection_name, prepared, batch_size=UPSERT_BATCH_SIZE):
+    """Store the output of prepare_file_points for one or more files.
 
-    except Exception as e:
-        error_msg = f"Error processing {file_path}: {str(e)}"
-        print(error_msg)
-        return {"error": error_msg}
+    Points from all files are upserted together, ``batch_size`` at a time.
+    """
+    points = [p for item in prepared for p in item["points"]]
+    if chunk_store.enabled():
+        # Text first, so a point is never visible without its text
+        store = chunk_store.get_chunk_store(collection_name)
+        with span("ingest.chunk_store", chunks=len(points)):
+            for item in prepared:
+                store.put_chunks(item["doc_id"], [(p["id"], p["payload"]["chunk_id"], text, p["payload"]["char_start"])
+                                                  for p, text in zip(item["points"], item["texts"])])
+    print(f"Storing {len(points)} points in vector database...")
+    with span("ingest.upsert", points=len(points), files=len(prepared), backend=VECTOR_DB):
+        for i in range(0, len(points), batch_size):
+            client.upsert(collection_name=collection_name, points=points[i:i + batch_size])
 
 # Clear vector database collection
 def clear_vector_db(collection_name="file_vectors"):
     """Clear all data from the vector database collection"""
     try:
-        client, _ = initialize_vector_db(collection_name)
-        client.delete_collection(collection_name)
-        print(f"Cleared collection: {collection_name}")
-
-        # Recreate the collection
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=qmodels.VectorParams(size=384, distance=qmodels.Distance.COSINE)
-        )
-        print(f"Recreated collection: {collection_name}")
+        client = get_client()
+        client.clear(collection_name, VECTOR_SIZE)
+        if chunk_store.enabled():
+            chunk_store.get_chunk_store(collection_name).clear()
+        _ready_collections.add(collection_name)
+        print(f"Cleared and recreated collection: {collection_name}")
         return {"message": f"Successfully cleared and recreated collection {collection_name}"}
 
     except Exception as e:
@@ -308,7 +615,7 @@ def clear_vector_db(collection_name="file_vectors"):
 
 
 # --------- Additional utilities for inspecting indexed data ---------
-def list_indexed_files(client: QdrantClient, collection_name="file_vectors"):
+def list_indexed_files(client, collection_name="file_vectors"):
     """Return a summary of indexed files: file_path -> {chunks, categories}
 
     This will iterate (scroll) through the collection payloads and aggregate
@@ -316,14 +623,15 @@ def list_indexed_files(client: QdrantClient, collection_name="file_vectors"):
     """
     try:
         files = {}
-        offset = 0
+        offset = None
         limit = 500
+        # doc_id -> file_path for points whose text lives in the chunk store
+        doc_paths = chunk_store.get_chunk_store(collection_name).document_paths() if chunk_store.enabled() else {}
 
         while True:
-            # scroll returns points with payloads; use with_payload=True
-            points = client.scroll(collection_name=collection_name, offset=offset, limit=limit, with_payload=True)
-            if not points:
-                break
+            # scroll returns (points, next_offset); next_offset is None after the last page
+            points, offset = client.scroll(collection_name=collection_name, offset=offset, limit=limit,
+                                           with_payload=['file_path', 'filePath', 'path', 'doc_id', 'chunk_id', 'chunkId', 'category_id', 'category'])
 
             for p in points:
                 # payload may be attribute or dict depending on qdrant-client version
@@ -336,7 +644,7 @@ def list_indexed_files(client: QdrantClient, collection_name="file_vectors"):
                 if not payload:
                     continue
 
-                file_path = payload.get('file_path') or payload.get('filePath') or payload.get('path')
+                file_path = payload.get('file_path') or payload.get('filePath') or payload.get('path') or doc_paths.get(payload.get('doc_id'))
                 if not file_path:
                     continue
 
@@ -352,10 +660,7 @@ def list_indexed_files(client: QdrantClient, collection_name="file_vectors"):
                 if cat is not None:
                     entry['categories'].add(cat)
 
-            # advance offset
-            offset += len(points)
-            # if fewer than limit returned, we're done
-            if len(points) < limit:
+            if offset is None:
                 break
 
         # Convert category sets to lists for JSON serialization
@@ -374,10 +679,10 @@ def list_indexed_files(client: QdrantClient, collection_name="file_vectors"):
         return {'error': str(e)}
 
 
-def is_file_indexed(client: QdrantClient, file_path: str, collection_name="file_vectors"):
+def is_file_indexed(client, file_path: str, collection_name="file_vectors"):
     """Return True if any point in the collection has payload.file_path == file_path."""
     try:
-        # Use scroll with a query_filter to find any matching payload quickly
+        # Use scroll with a filter to find any matching payload quickly
         query_filter = {
             "must": [
                 {
@@ -386,8 +691,13 @@ def is_file_indexed(client: QdrantClient, file_path: str, collection_name="file_
                 }
             ]
         }
+        if chunk_store.enabled():
+            # Points ingested with the chunk store carry doc_id instead of file_path
+            doc_id = chunk_store.get_chunk_store(collection_name).document_id(file_path)
+            if doc_id is not None:
+                query_filter = {"must": [{"key": "doc_id", "match": {"value": doc_id}}]}
 
-        points = client.scroll(collection_name=collection_name, limit=1, with_payload=True, query_filter=query_filter)
+        points, _ = client.scroll(collection_name=collection_name, limit=1, with_payload=False, scroll_filter=query_filter)
         return bool(points and len(points) > 0)
     except Exception as e:
         print(f"Error checking if file is indexed: {e}")
@@ -397,12 +707,9 @@ def is_file_indexed(client: QdrantClient, file_path: str, collection_name="file_
 def process_files(directory_path, collection_name="file_vectors", category_id=None):
     client, embedding_model = initialize_vector_db(collection_name)
 
-    # Supported file extensions
-    supported_extensions = {'.txt', '.pdf', '.docx', '.png', '.jpg', '.jpeg'}
-
     # Process all files in directory
     for file_path in Path(directory_path).rglob('*'):
-        if file_path.suffix.lower() in supported_extensions:
+        if file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
             print(f"Processing {file_path}...")
             if category_id:
                 print(f"Using category_id: {category_id}")
@@ -0,0 +1,202 @@
+"""Optional capture of /query traffic for capacity testing and replay.
+
+When RAG_QUERY_LOG_DIR is set, every /query request is recorded as one JSON
+line: arrival time, question (or its SHA-256 when RAG_QUERY_LOG_TEXT=0), category,
+limit, the other request options, status, latencies and the returned hit IDs.
+The request path only appends to a bounded in-memory queue. A background
+thread does the serialisation, gzip compression and file I/O. If the queue is
+full the record is dropped and counted, never blocking a request. If the log
+directory or writer cannot be set up, logging turns itself off (printing the
+error once) and further records are counted as dropped; a query never fails
+because of its log record.
+
+Files are named queries-<start time>-<pid>.jsonl.gz, so several workers can
+share one directory. They rotate by size or age. Replay them with
+app/replay_queries.py, or learn score thresholds from them with
+app/calibrate_thresholds.py.
+
+    RAG_QUERY_LOG_DIR             directory for the log files (unset: logging off)
+    RAG_QUERY_LOG_TEXT            keep question text (default 1); 0 stores only its hash
+    RAG_QUERY_LOG_ROTATE_MB       rotate after this many uncompressed MB (default 64)
+    RAG_QUERY_LOG_ROTATE_SECONDS  rotate after this many seconds (default 3600)
+    RAG_QUERY_LOG_QUEUE           records buffered before dropping (default 10000)
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+QUERY_LOG_DIR = os.getenv("RAG_QUERY_LOG_DIR", "")
+LOG_TEXT = os.getenv("RAG_QUERY_LOG_TEXT", "1").strip().lower() in ("1", "true", "yes", "on")
+ROTATE_BYTES = int(float(os.getenv("RAG_QUERY_LOG_ROTATE_MB", "64")) * 1024 * 1024)
+ROTATE_SECONDS = float(os.getenv("RAG_QUERY_LOG_ROTATE_SECONDS", "3600"))
+QUEUE_SIZE = int(os.getenv("RAG_QUERY_LOG_QUEUE", "10000"))
+
+# Seconds between flushes of the current file, so a crash loses little
+FLUSH_INTERVAL = 1.0
+
+_writer = None
+_writer_lock = threading.Lock()
+# Set when the writer could not be created or fed; records are then dropped
+_failed = False
+_failed_dropped = 0
+
+
+def enabled():
+    return bool(QUERY_LOG_DIR)
+
+
+def question_hash(question):
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+
+class QueryLogWriter:
+    """Background writer of rotating gzip-compressed JSONL files."""
+
+    def __init__(self, directory, rotate_bytes=ROTATE_BYTES, rotate_seconds=ROTATE_SECONDS, queue_size=QUEUE_SIZE):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._file = None
+        self._opened_at = 0.0
+        self._bytes = 0
+        self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        # The stop event ends the thread once the queue is drained, even when
+        # the queue is too full to take the None sentinel in time
+        self._stop.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = self.directory / f"queries-{stamp}-{os.getpid()}.jsonl.gz"
+        self._file = gzip.open(path, "at", encoding="utf-8", compresslevel=6)
+        self._opened_at = time.time()
+        self._bytes = 0
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                if self._stop.is_set():
+                    break
+                record = False
+            if record is None:
+                break
+            try:
+                if record:
+                    if self._file is None or self._bytes >= self.rotate_bytes \
+                            or time.time() - self._opened_at >= self.rotate_seconds:
+                        self._close_file()
+                        self._open()
+                    line = json.dumps(record, separators=(",", ":")) + "\n"
+                    self._file.write(line)
+                    self._bytes += len(line)
+                    self.written += 1
+                if self._file is not None and time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                print(f"Query log write failed: {e}")
+                self._close_file()
+        self._close_file()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = QueryLogWriter(QUERY_LOG_DIR)
+            print(f"Logging /query traffic to {QUERY_LOG_DIR}")
+        return _writer
+
+
+def record_query(question, category_id, limit, options, status, latency_ms, hit_ids=(), scores=(), arrived_at=None,
+                 **fields):
+    """Queue one /query record; a no-op unless RAG_QUERY_LOG_DIR is set.
+
+    ``ts`` is when the request arrived (``arrived_at``, else now minus the
+    latency), so a replay sends requests in their original order. Never raises.
+    """
+    global _failed, _failed_dropped
+    if not enabled():
+        return
+    if _failed:
+        _failed_dropped += 1
+        return
+    try:
+        _record_query(question, category_id, limit, options, status, latency_ms, hit_ids, scores, arrived_at, fields)
+    except Exception as e:
+        _failed_dropped += 1
+        if not _failed:
+            _failed = True
+            print(f"Query log disabled: {e}")
+
+
+def _record_query(question, category_id, limit, options, status, latency_ms, hit_ids, scores, arrived_at, fields):
+    if arrived_at is None:
+        arrived_at = time.time() - latency_ms / 1000
+    record = {"ts": round(arrived_at, 3)}
+    if LOG_TEXT:
+        record["question"] = question
+    record["question_hash"] = question_hash(question)
+    record.update({
+        "category_id": category_id,
+        "limit": limit,
+        "options": {k: v for k, v in options.items() if v is not None},
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+        "hit_ids": list(hit_ids),
+        "scores": [round(s, 4) for s in scores],
+    })
+    record.update(fields)
+    get_writer().write(record)
+
+
+def render_metrics():
+    """Prometheus text lines for the writer's counters."""
+    writer = _writer
+    lines = []
+    for name, help_text, value in (
+        ("rag_query_log_written_total", "Query log records written.", writer.written if writer else 0),
+        ("rag_query_log_dropped_total", "Query log records dropped because the queue was full or logging failed.",
+         (writer.dropped if writer else 0) + _failed_dropped),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def close():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Replay recorded /query traffic (see app/query_log.py) for capacity testing.
+
+Requests are sent at their recorded arrival times ("ts") with the spacing
+divided by --speedup, either to a running service (--url) or to the app
+in-process through an ASGI transport, using the vector store configured by the
+environment. Reports throughput, the latency distribution, status codes and
+result drift against the recording:
+
+    top1_same     share of queries whose first hit is the recorded first hit
+    overlap       mean |recorded ∩ replayed| / |recorded ∪ replayed| of hit IDs
+    identical     share of queries returning exactly the recorded hit list
+
+Records logged with RAG_QUERY_LOG_TEXT=0 carry only a question hash and are skipped.
+
+Run from the rag-service directory:
+    python -m app.replay_queries query_logs/*.jsonl.gz --speedup 10
+    python -m app.replay_queries query_logs/*.jsonl.gz --url http://localhost:8001 --speedup 0
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import time
+
+
+def read_records(paths):
+    """Replayable records from query logs, in arrival order."""
+    records = []
+    skipped = 0
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if record.get("question"):
+                    records.append(record)
+                else:
+                    skipped += 1
+    records.sort(key=lambda r: r.get("ts", 0))
+    return records, skipped
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def drift(recorded, replayed):
+    recorded_set, replayed_set = set(recorded), set(replayed)
+    union = recorded_set | replayed_set
+    return {
+        "top1_same": bool(recorded) and bool(replayed) and recorded[0] == replayed[0],
+        "overlap": len(recorded_set & replayed_set) / len(union) if union else 1.0,
+        "identical": recorded == replayed,
+    }
+
+
+async def replay(records, post, speedup, concurrency):
+    """Send every record through ``post(body) -> (status, json)``; returns per-request outcomes."""
+    sem = asyncio.Semaphore(concurrency)
+    outcomes = []
+    t0 = records[0].get("ts", 0) if records else 0
+    start = time.perf_counter()
+
+    async def one(record):
+        body = {"question": record["question"], "limit": record.get("limit", 5),
+                "category_id": record.get("category_id"), **record.get("options", {})}
+        async with sem:
+            sent = time.perf_counter()
+            try:
+                status, data = await post(body)
+            except Exception as e:
+                status, data = f"error: {type(e).__name__}", {}
+            latency = time.perf_counter() - sent
+        outcome = {"status": status, "latency": latency}
+        if status == 200 and record.get("status") == 200:
+            outcome.update(drift(record.get("hit_ids", []), [r.get("id") for r in data.get("results", [])]))
+        outcomes.append(outcome)
+
+    tasks = []
+    for record in records:
+        if speedup > 0:
+            delay = (record.get("ts", t0) - t0) / speedup - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(record)))
+    await asyncio.gather(*tasks)
+    return outcomes, time.perf_counter() - start
+
+
+def report(records, outcomes, elapsed, skipped):
+    latencies = sorted(o["latency"] * 1000 for o in outcomes)
+    statuses = {}
+    for o in outcomes:
+        statuses[str(o["status"])] = statuses.get(str(o["status"]), 0) + 1
+    recorded_span = records[-1].get("ts", 0) - records[0].get("ts", 0)
+
+    print(f"Replayed {len(outcomes)} queries in {elapsed:.2f}s ({len(outcomes) / elapsed:.1f} qps); "
+          f"recorded over {recorded_span:.1f}s; skipped {skipped} records without question text")
+    print(f"Status: {statuses}")
+    if latencies:
+        print("Latency ms: " + "  ".join(
+            f"{name} {percentile(latencies, q):.2f}" for name, q in
+            (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))) + f"  max {latencies[-1]:.2f}")
+    recorded_ms = sorted(r["latency_ms"] for r in records if "latency_ms" in r)
+    if recorded_ms:
+        print(f"Recorded latency ms: p50 {percentile(recorded_ms, 0.5):.2f}  p95 {percentile(recorded_ms, 0.95):.2f}")
+    compared = [o for o in outcomes if "overlap" in o]
+    if compared:
+        n = len(compared)
+        print(f"Drift over {n} queries: top1_same {sum(o['top1_same'] for o in compared) / n:.1%}  "
+              f"overlap {sum(o['overlap'] for o in compared) / n:.3f}  "
+              f"identical {sum(o['identical'] for o in compared) / n:.1%}")
+
+
+async def main_async(args):
+    records, skipped = read_records(args.logs)
+    if args.max_records:
+        records = records[:args.max_records]
+    if not records:
+        print(f"No replayable records (skipped {skipped})")
+        return
+
+    import httpx
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        # Do not record the replay itself into the query log
+        os.environ["RAG_QUERY_LOG_DIR"] = ""
+        from app import app as service
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=service.app), base_url="http://replay",
+                                   timeout=args.timeout)
+
+    async def post(body):
+        r = await client.post("/query", json=body)
+        return r.status_code, (r.json() if r.status_code == 200 else {})
+
+    async with client:
+        outcomes, elapsed = await replay(records, post, args.speedup, args.concurrency)
+    report(records, outcomes, elapsed, skipped)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="query log files (.jsonl or .jsonl.gz)")
+    parser.add_argument("--url", help="base URL of a running service; in-process when omitted")
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide recorded gaps by this; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--max-records", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Post-retrieval stage for /query results.
+
+Qdrant returns the nearest chunks independently, so with ``chunk_overlap=200``
+two neighbouring chunks of the same file often both land in the top results.
+This module takes an over-fetched hit list and:
+
+1. collapses adjacent chunks from the same ``file_path`` into merged spans of
+   at most RAG_MERGE_MAX_CHUNKS chunks,
+2. optionally applies MMR (maximal marginal relevance) for diversity,
+3. optionally reranks the survivors with a CPU cross-encoder in batches,
+4. optionally drops the low-relevance tail after the largest score gap.
+
+Every step can be switched on or off per request and is timed.
+"""
+import math
+import os
+import time
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Defaults, overridable per request through QueryRequest fields
+MERGE_ADJACENT = _env_flag("RAG_MERGE_ADJACENT", True)
+DIVERSIFY = _env_flag("RAG_MMR", False)
+RERANK = _env_flag("RAG_RERANK", False)
+ADAPTIVE_CUTOFF = _env_flag("RAG_ADAPTIVE_CUTOFF", False)
+OVERFETCH_FACTOR = max(1, int(os.getenv("RAG_OVERFETCH_FACTOR", "3")))
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+RERANK_MODEL = os.getenv("RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RAG_RERANK_BATCH_SIZE", "16"))
+# Adaptive cutoff: cut at the largest drop between consecutive scores when it is
+# at least SCORE_GAP_MIN and at least SCORE_GAP_SHARE of the whole score spread
+SCORE_GAP_MIN = float(os.getenv("RAG_SCORE_GAP_MIN", "0.05"))
+SCORE_GAP_SHARE = float(os.getenv("RAG_SCORE_GAP_SHARE", "0.5"))
+CUTOFF_MIN_KEEP = max(1, int(os.getenv("RAG_CUTOFF_MIN_KEEP", "1")))
+# Longest merged span, so over-fetched neighbours do not swell a result
+MERGE_MAX_CHUNKS = max(1, int(os.getenv("RAG_MERGE_MAX_CHUNKS", "3")))
+# Must match the chunk_overlap used by split_text at ingest time
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "200"))
+# Shortest text match trusted as overlap for points ingested without offsets
+MERGE_MIN_OVERLAP = max(1, int(os.getenv("RAG_MERGE_MIN_OVERLAP", "20")))
+
+_reranker = None
+_reranker_failed = False
+
+
+def fetch_limit(limit, merge_adjacent, diversify, rerank):
+    """Number of hits to request from Qdrant so post-processing has room to work."""
+    if merge_adjacent or diversify or rerank:
+        return limit * OVERFETCH_FACTOR
+    return limit
+
+
+def hit_to_candidate(hit):
+    """Convert a Qdrant ScoredPoint into the plain dict used by this stage."""
+    payload = dict(hit.payload or {})
+    chunk_id = payload.get("chunk_id", 0) or 0
+    vector = getattr(hit, "vector", None)
+    if isinstance(vector, dict):
+        # Named vectors: use the first (and only) one
+        vector = next(iter(vector.values()), None)
+    return {
+        "id": str(hit.id),
+        "score": hit.score,
+        "payload": payload,
+        "vector": vector,
+        "chunk_start": chunk_id,
+        "chunk_end": chunk_id,
+        # Distinct chunks making up this span, in chunk order
+        "member_ids": [str(hit.id)],
+    }
+
+
+def merge_overlap(left, right, left_end=None, right_start=None, max_overlap=CHUNK_OVERLAP,
+                  min_overlap=MERGE_MIN_OVERLAP):
+    """Join two consecutive chunks, dropping the text they share.
+
+    ``left_end`` and ``right_start`` are character offsets in the source
+    document (the char_end/char_start payload fields). With them the shared
+    text is exactly ``left_end - right_start`` characters; a positive gap is
+    whitespace the splitter stripped, restored as a space or a paragraph break.
+    Points ingested without offsets fall back to the longest suffix/prefix
+    match of at least ``min_overlap`` characters.
+    """
+    if left_end is not None and right_start is not None:
+        gap = right_start - left_end
+        if gap >= 0:
+            return left + ("" if gap == 0 else " " if gap == 1 else "\n\n") + right
+        return left + right[-gap:]
+    limit = min(max_overlap, len(left), len(right))
+    for size in range(limit, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def join_chunks(parts):
+    """Join consecutive chunks given as ``[(text, char_start or None), ...]``."""
+    text, end = "", None
+    for chunk, start in parts:
+        if text:
+            text = merge_overlap(text, chunk, end, start)
+        else:
+            text = chunk
+        end = start + len(chunk) if start is not None else None
+    return text
+
+
+def merge_adjacent_chunks(candidates, max_chunks=MERGE_MAX_CHUNKS):
+    """Collapse runs of consecutive chunk_ids from the same file into spans.
+
+    A span covers at most MERGE_MAX_CHUNKS chunks; a longer run is split.
+    The merged span keeps the best score of its members and the vector of the
+    best-scoring member, and records the covered range in chunk_start/chunk_end
+    (and page_end/char_end in the payload, when the chunks carry them).
+    When chunk text is kept out of the payload (see app.chunk_store) only the
+    member ids are merged here; the text is joined when the span is hydrated.
+    """
+    by_file = {}
+    for c in candidates:
+        payload = c["payload"]
+        key = payload.get("file_path") or ("doc", payload.get("doc_id"))
+        by_file.setdefault(key, []).append(c)
+
+    merged = []
+    for file_candidates in by_file.values():
+        file_candidates.sort(key=lambda c: c["chunk_start"])
+        current = None
+        for c in file_candidates:
+            if current is not None and c["chunk_start"] <= current["chunk_end"] + 1:
+                extends = c["chunk_start"] > current["chunk_end"]
+                if extends and c["chunk_end"] - current["chunk_start"] >= max_chunks:
+                    # Span is full; the chunk starts the next one
+                    current = None
+                elif extends:
+                    if "content" in current["payload"]:
+                        current["payload"]["content"] = merge_overlap(
+                            current["payload"]["content"],
+                            c["payload"].get("content", ""),
+                            current["payload"].get("char_end"),
+                            c["payload"].get("char_start"),
+                        )
+                    current["chunk_end"] = c["chunk_end"]
+                    current["member_ids"].append(c["id"])
+                    # The span ends where its last chunk ends
+                    for key in ("page_end", "char_end"):
+                        if key in c["payload"]:
+                            current["payload"][key] = c["payload"][key]
+            if current is not None and c["chunk_start"] <= current["chunk_end"]:
+                if c["score"] > current["score"]:
+                    current["score"] = c["score"]
+                    current["vector"] = c["vector"]
+                continue
+            current = dict(c, payload=dict(c["payload"]), member_ids=list(c["member_ids"]))
+            merged.append(current)
+
+    for c in merged:
+        if "content" in c["payload"]:
+            c["payload"]["content_length"] = len(c["payload"]["content"])
+    merged.sort(key=lambda c: c["score"], reverse=True)
+    return merged
+
+
+def _cosine(a, b, norm_a, norm_b):
+    if not norm_a or not norm_b:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / (norm_a * norm_b)
+
+
+def mmr_select(candidates, k, lambda_mult=MMR_LAMBDA):
+    """Pick ``k`` candidates trading relevance (Qdrant score) against redundancy.
+
+    Redundancy is the highest cosine similarity to an already selected
+    candidate. Candidates without a vector are treated as non-redundant.
+    """
+    if len(candidates) <= k:
+        return list(candidates)
+
+    norms = [math.sqrt(sum(x * x for x in c["vector"])) if c["vector"] else 0.0 for c in candidates]
+    remaining = list(range(len(candidates)))
+    max_sim = [0.0] * len(candidates)
+    selected = []
+
+    while remaining and len(selected) < k:
+        best = max(
+            remaining,
+            key=lambda i: lambda_mult * candidates[i]["score"] - (1 - lambda_mult) * max_sim[i],
+        )
+        selected.append(best)
+        remaining.remove(best)
+        chosen = candidates[best]
+        if not chosen["vector"]:
+            continue
+        for i in remaining:
+            if candidates[i]["vector"]:
+                sim = _cosine(candidates[i]["vector"], chosen["vector"], norms[i], norms[best])
+                if sim > max_sim[i]:
+                    max_sim[i] = sim
+
+    return [candidates[i] for i in selected]
+
+
+def _get_reranker():
+    """Load the cross-encoder once; returns None if it is not available."""
+    global _reranker, _reranker_failed
+    if _reranker is None and not _reranker_failed:
+        try:
+            from sentence_transformers import CrossEncoder
+            _reranker = CrossEncoder(RERANK_MODEL, device="cpu")
+            print(f"Loaded reranker model: {RERANK_MODEL}")
+        except Exception as e:
+            _reranker_failed = True
+            print(f"Reranker not available, skipping rerank stage: {e}")
+    return _reranker
+
+
+def rerank_candidates(question, candidates, batch_size=RERANK_BATCH_SIZE):
+    """Score (question, chunk) pairs with the cross-encoder and sort by that score.
+
+    Returns the candidates unchanged if no reranker could be loaded.
+    """
+    reranker = _get_reranker()
+    if reranker is None or not candidates:
+        return candidates, False
+
+    pairs = [(question, c["payload"].get("content", "")) for c in candidates]
+    scores = reranker.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+    for c, s in zip(candidates, scores):
+        c["rerank_score"] = float(s)
+    return sorted(candidates, key=lambda c: c["rerank_score"], reverse=True), True
+
+
+def _ranking_score(candidate):
+    return candidate.get("rerank_score", candidate["score"])
+
+
+def score_gap_cutoff(candidates, min_keep=CUTOFF_MIN_KEEP, min_gap=SCORE_GAP_MIN, gap_share=SCORE_GAP_SHARE):
+    """Drop the candidates below the knee of the score curve.
+
+    Scores (rerank score when present) are sorted and the largest drop between
+    neighbours, past the first ``min_keep``, is the knee. Everything below it is
+    dropped only if the drop is clear: at least ``min_gap`` and at least
+    ``gap_share`` of the spread between the best and worst score. Candidate
+    order is preserved. Returns ``(candidates, cut_score)``, where cut_score is
+    None when nothing was dropped.
+    """
+    scores = sorted((_ranking_score(c) for c in candidates), reverse=True)
+    if len(scores) <= min_keep:
+        return candidates, None
+    gaps = [(scores[i] - scores[i + 1], i) for i in range(min_keep - 1, len(scores) - 1)]
+    gap, knee = max(gaps)
+    spread = scores[0] - scores[-1]
+    if gap < min_gap or gap < gap_share * spread:
+        return candidates, None
+    cut_score = scores[knee]
+    return [c for c in candidates if _ranking_score(c) >= cut_score], cut_score
+
+
+def postprocess_hits(question, hits, limit, merge_adjacent=MERGE_ADJACENT, diversify=DIVERSIFY, rerank=RERANK,
+                     hydrate=None, adaptive_cutoff=ADAPTIVE_CUTOFF):
+    """Run the enabled post-retrieval steps over Qdrant hits.
+
+    Returns ``(candidates, stats)`` where ``candidates`` holds at most ``limit``
+    dicts and ``stats`` records which steps ran and how long each took in ms.
+    ``hydrate`` (candidates -> candidates) fills in chunk text kept outside the
+    payload; it runs on the final top-k, or before the reranker, which needs text.
+    ``adaptive_cutoff`` applies score_gap_cutoff to the top-k, before hydration.
+    """
+    timings = {}
+    stats = {"fetched": len(hits), "timings_ms": timings}
+
+    start = time.perf_counter()
+    candidates = [hit_to_candidate(h) for h in hits]
+    timings["convert"] = round((time.perf_counter() - start) * 1000, 3)
+
+    if merge_adjacent:
+        start = time.perf_counter()
+        candidates = merge_adjacent_chunks(candidates)
+        timings["merge_adjacent"] = round((time.perf_counter() - start) * 1000, 3)
+        stats["after_merge"] = len(candidates)
+
+    if diversify:
+        start = time.perf_counter()
+        # Keep a wider pool for the reranker when it runs after MMR
+        pool = limit * 2 if rerank else limit
+        candidates = mmr_select(candidates, pool)
+        timings["mmr"] = round((time.perf_counter() - start) * 1000, 3)
+
+    if rerank:
+        if hydrate is not None:
+            start = time.perf_counter()
+            candidates = hydrate(candidates)
+            timings["hydrate"] = round((time.perf_counter() - start) * 1000, 3)
+        start = time.perf_counter()
+        candidates, reranked = rerank_candidates(question, candidates)
+        timings["rerank"] = round((time.perf_counter() - start) * 1000, 3)
+        stats["reranked"] = reranked
+
+    candidates = candidates[:limit]
+    if adaptive_cutoff:
+        start = time.perf_counter()
+        kept = len(candidates)
+        candidates, cut_score = score_gap_cutoff(candidates)
+        timings["cutoff"] = round((time.perf_counter() - start) * 1000, 3)
+        stats["cutoff_dropped"] = kept - len(candidates)
+        stats["cutoff_score"] = cut_score
+
+    if hydrate is not None and not rerank:
+        start = time.perf_counter()
+        candidates = hydrate(candidates)
+        timings["hydrate"] = round((time.perf_counter() - start) * 1000, 3)
+
+    stats["returned"] = len(candidates)
+    return candidates, stats
@@ -0,0 +1,276 @@
+"""In-process retrieval shared by the /query endpoint and the langgraph agent tools.
+
+Both callers go through the pooled vector store from ``initialize_vector_db``
+and a small LRU cache of question embeddings, so an agent step costs one
+vector search and no HTTP hop.
+"""
+import json
+import os
+from functools import lru_cache
+
+from app.ingest import initialize_vector_db, simple_text_embedding
+from app.vector_store import VECTOR_DB
+from app.tracing import span, current_span
+from app import chunk_store, rerank, shared_cache
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Minimum vector score, passed to the store so low-relevance hits are never
+# fetched. Per-category values learned by app/calibrate_thresholds.py in
+# RAG_SCORE_THRESHOLDS_FILE take precedence over RAG_SCORE_THRESHOLD.
+SCORE_THRESHOLD = float(os.environ["RAG_SCORE_THRESHOLD"]) if os.getenv("RAG_SCORE_THRESHOLD") else None
+SCORE_THRESHOLDS_FILE = os.getenv("RAG_SCORE_THRESHOLDS_FILE", "./score_thresholds.json")
+
+_thresholds = {}
+_thresholds_mtime = None
+
+
+@lru_cache(maxsize=EMBEDDING_CACHE_SIZE)
+def _cached_embedding(text):
+    return tuple(simple_text_embedding(text))
+
+
+def embed_query(text):
+    """Embedding for a question, served from a cache when repeated.
+
+    Under ``python -m app.serve`` the cache is shared by all workers
+    (app.shared_cache); otherwise it is a per-process LRU cache.
+    """
+    cache = shared_cache.embedding_cache()
+    if cache is None:
+        return list(_cached_embedding(text))
+    vector = cache.get(text)
+    if vector is None:
+        vector = simple_text_embedding(text)
+        cache.put(text, vector)
+    return vector
+
+
+def category_match_values(category_id):
+    """Return (filter value, acceptable payload values) for a category id.
+
+    Numeric-looking ids are matched as int since ingest stores them that way,
+    but string payloads from older ingests are still accepted.
+    """
+    match_value = category_id
+    match_values = {category_id}
+    if isinstance(category_id, str) and category_id.isdigit():
+        match_value = int(category_id)
+        match_values.add(match_value)
+    elif isinstance(category_id, int):
+        match_values.add(str(category_id))
+    return match_value, match_values
+
+
+def score_threshold_for(category_id=None):
+    """Score threshold for a query: calibrated per category, else the default.
+
+    The thresholds file is re-read when it changes, so a calibration run takes
+    effect without a restart.
+    """
+    global _thresholds, _thresholds_mtime
+    try:
+        mtime = os.stat(SCORE_THRESHOLDS_FILE).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _thresholds_mtime:
+        _thresholds_mtime = mtime
+        _thresholds = {}
+        if mtime is not None:
+            try:
+                with open(SCORE_THRESHOLDS_FILE, "r", encoding="utf-8") as f:
+                    _thresholds = json.load(f)
+                print(f"Loaded score thresholds from {SCORE_THRESHOLDS_FILE}")
+            except Exception as e:
+                print(f"Ignoring unreadable score thresholds file {SCORE_THRESHOLDS_FILE}: {e}")
+
+    categories = _thresholds.get("categories", {})
+    if category_id is not None and str(category_id) in categories:
+        return categories[str(category_id)]
+    return _thresholds.get("default", SCORE_THRESHOLD)
+
+
+def page_range_conditions(page_from=None, page_to=None):
+    """Filter conditions keeping chunks that overlap pages page_from..page_to.
+
+    Either bound may be None. Chunks without page metadata never match.
+    """
+    conditions = []
+    if page_from is not None:
+        conditions.append({"key": "page_end", "range": {"gte": page_from}})
+    if page_to is not None:
+        conditions.append({"key": "page_start", "range": {"lte": page_to}})
+    return conditions
+
+
+def search_hits(question, limit, category_id=None, with_vectors=False, collection_name="file_vectors",
+                page_from=None, page_to=None, score_threshold=None):
+    """Vector search with the category filter and the unfiltered fallback.
+
+    The page range filter and score threshold, if any, also apply to the fallback search.
+    Returns ``(hits, fallback_used)`` where hits expose id, score, payload and vector.
+    """
+    client, _ = initialize_vector_db(collection_name)
+
+    with span("query.embed", chars=len(question)) as s:
+        cache = shared_cache.embedding_cache()
+        cached = cache.hits if cache is not None else _cached_embedding.cache_info().hits
+        query_vector = embed_query(question)
+        s.set_attribute("cache_hit", (cache.hits if cache is not None else _cached_embedding.cache_info().hits) > cached)
+
+    search_query = {
+        "collection_name": collection_name,
+        "query_vector": query_vector,
+        "limit": limit,
+        "with_payload": True,
+        "with_vectors": with_vectors
+    }
+    if score_threshold is not None:
+        search_query["score_threshold"] = score_threshold
+
+    page_conditions = page_range_conditions(page_from, page_to)
+    if page_conditions:
+        search_query["query_filter"] = {"must": list(page_conditions)}
+
+    # Add category filter if specified. Try to coerce numeric category IDs to int so
+    # they match payloads that may have been stored as integers.
+    if category_id:
+        match_value, match_values = category_match_values(category_id)
+        search_query["query_filter"] = {
+            "must": [
+                {
+                    "key": "category_id",
+                    "match": {
+                        "value": match_value
+                    }
+                }
+            ] + page_conditions
+        }
+
+    with span("query.search", backend=VECTOR_DB, limit=limit, filtered=bool(category_id),
+              page_filtered=bool(page_conditions)) as s:
+        search_result = client.search(**search_query)
+        s.set_attribute("hits", len(search_result))
+
+    # If we filtered by category and got no hits, try a fallback:
+    # perform the same search without the category condition and post-filter by payload values
+    fallback_used = False
+    if category_id and not search_result:
+        print("No hits for filtered query, attempting fallback search without filter and post-filtering payloads")
+        fallback_query = dict(search_query)
+        del fallback_query["query_filter"]
+        if page_conditions:
+            fallback_query["query_filter"] = {"must": list(page_conditions)}
+        fallback_used = True
+
+        try:
+            with span("query.fallback_search", backend=VECTOR_DB, limit=limit) as s:
+                fallback_hits = client.search(**fallback_query)
+                s.set_attribute("hits", len(fallback_hits))
+            print(f"Fallback search returned {len(fallback_hits)} total hits; post-filtering by category_id={category_id!r}")
+
+            filtered_hits = []
+            for hit in fallback_hits:
+                pval = (hit.payload or {}).get("category_id")
+                if pval in match_values or (isinstance(pval, int) and str(pval) in match_values):
+                    filtered_hits.append(hit)
+
+            print(f"After post-filtering fallback hits, {len(filtered_hits)} hits match the category metadata")
+            if filtered_hits:
+                search_result = filtered_hits
+            else:
+                print("Fallback post-filtering found 0 matching hits; returning empty results for the category filter")
+        except Exception as e:
+            print(f"Fallback search failed: {e}")
+
+    return search_result, fallback_used
+
+
+def retrieve(question, limit=5, category_id=None, merge_adjacent=None, diversify=None, use_rerank=None,
+             page_from=None, page_to=None, score_threshold=None, adaptive_cutoff=None):
+    """Search and post-process; returns ``(candidates, stats)`` as in rerank.postprocess_hits.
+
+    ``None`` for a post-processing switch means the RAG_* environment default.
+    ``page_from``/``page_to`` restrict results to chunks overlapping that page range.
+    ``score_threshold`` None means the calibrated / configured threshold (see score_threshold_for).
+    """
+    merge_adjacent = rerank.MERGE_ADJACENT if merge_adjacent is None else merge_adjacent
+    diversify = rerank.DIVERSIFY if diversify is None else diversify
+    use_rerank = rerank.RERANK if use_rerank is None else use_rerank
+    adaptive_cutoff = rerank.ADAPTIVE_CUTOFF if adaptive_cutoff is None else adaptive_cutoff
+    if score_threshold is None:
+        score_threshold = score_threshold_for(category_id)
+
+    # Over-fetch when post-processing is enabled so that merging neighbours and
+    # diversifying still leave `limit` distinct results.
+    hits, fallback_used = search_hits(
+        question,
+        rerank.fetch_limit(limit, merge_adjacent, diversify, use_rerank),
+        category_id=category_id,
+        with_vectors=diversify,
+        page_from=page_from,
+        page_to=page_to,
+        score_threshold=score_threshold,
+    )
+    with span("query.postprocess", merge_adjacent=merge_adjacent, diversify=diversify, rerank=use_rerank,
+              adaptive_cutoff=adaptive_cutoff) as s:
+        candidates, stats = rerank.postprocess_hits(
+            question, hits, limit, merge_adjacent=merge_adjacent, diversify=diversify, rerank=use_rerank,
+            hydrate=chunk_store.hydrate if chunk_store.enabled() else None, adaptive_cutoff=adaptive_cutoff,
+        )
+        s.set_attributes(fetched=stats["fetched"], returned=stats["returned"])
+    stats["fallback_used"] = fallback_used
+    stats["score_threshold"] = score_threshold
+    current_span().set_attribute("fallback_used", fallback_used)
+    return candidates, stats
+
+
+def citation(payload):
+    """Page range and character range of a chunk or merged span, None where unknown."""
+    page_range = None
+    if "page_start" in payload:
+        page_range = [payload["page_start"], payload.get("page_end", payload["page_start"])]
+    char_range = None
+    if "char_start" in payload:
+        char_range = [payload["char_start"], payload.get("char_end", payload["char_start"])]
+    return page_range, char_range
+
+
+def chunk_reference(candidate, preview_chars=160):
+    """Compact reference to a retrieved span: location, score and a short preview."""
+    payload = candidate["payload"]
+    content = payload.get("content", "")
+    page_range, _ = citation(payload)
+    return {
+        "file_path": payload.get("file_path", ""),
+        "chunk_range": [candidate["chunk_start"], candidate["chunk_end"]],
+        "page_range": page_range,
+        "score": round(candidate["score"], 4),
+        "preview": content[:preview_chars] + ("..." if len(content) > preview_chars else ""),
+    }
+
+
+def fetch_chunks(file_path, chunk_start, chunk_end=None, collection_name="file_vectors"):
+    """Return the stored text of chunks chunk_start..chunk_end of a file, in order."""
+    chunk_end = chunk_start if chunk_end is None else chunk_end
+    if chunk_store.enabled():
+        store = chunk_store.get_chunk_store(collection_name)
+        doc_id = store.document_id(file_path)
+        texts = store.get_range(doc_id, chunk_start, chunk_end) if doc_id is not None else []
+    else:
+        client, _ = initialize_vector_db(collection_name)
+        query_filter = {
+            "must": [
+                {"key": "file_path", "match": {"value": file_path}},
+                {"key": "chunk_id", "range": {"gte": chunk_start, "lte": chunk_end}}
+            ]
+        }
+        points, _ = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=query_filter,
+            limit=chunk_end - chunk_start + 1,
+            with_payload=True,
+        )
+        chunks = sorted((p.payload for p in points), key=lambda p: p.get("chunk_id", 0))
+        texts = [(payload.get("content", ""), payload.get("char_start")) for payload in chunks]
+    return rerank.join_chunks(texts)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Production serve mode: N uvicorn workers forked from a warmed parent.
+
+    python -m app.serve                    # RAG_WORKERS workers on RAG_HOST:RAG_PORT
+
+The parent imports the app, pre-imports the parsers and splitter, loads the
+reranker when it is enabled, and creates the shared caches (app.shared_cache).
+It then binds the listening socket and forks the workers. Workers inherit all
+of that copy-on-write and accept from the one socket.
+
+Connections are opened in each worker by its own startup warm-up: Qdrant
+client, SQLite chunk store, executor threads and the query log writer. None of
+these survive fork safely, so the parent never opens them.
+
+A worker that dies is restarted. On SIGTERM or SIGINT the parent forwards
+SIGTERM to the workers. Each worker stops accepting, lets in-flight requests
+finish for up to RAG_GRACEFUL_TIMEOUT seconds, then waits for queued ingest
+jobs on its ingest pool before exiting. A bulk ingest stores its points batch
+by batch, so work done before a forced exit is kept.
+
+Each worker keeps its own /metrics counters, query coalescing and admission
+limits.
+
+    RAG_WORKERS            worker count, or "auto" (default): CPUs available to the
+                           process, honouring the affinity mask and cgroup CPU quota.
+                           The embedded backends (VECTOR_DB=numpy or qdrant-local) always
+                           run 1 worker: several processes writing the same NumPy files
+                           corrupt them, and embedded Qdrant locks its folder to one process
+    RAG_HOST, RAG_PORT     listen address (default 0.0.0.0:8001)
+    RAG_GRACEFUL_TIMEOUT   seconds in-flight requests get on shutdown (default 60)
+    RAG_PRELOAD            pre-import parsers and models in the parent (default 1)
+"""
+import math
+import os
+import signal
+import socket
+import sys
+import time
+
+HOST = os.getenv("RAG_HOST", "0.0.0.0")
+PORT = int(os.getenv("RAG_PORT", "8001"))
+GRACEFUL_TIMEOUT = float(os.getenv("RAG_GRACEFUL_TIMEOUT", "60"))
+PRELOAD = os.getenv("RAG_PRELOAD", "1").strip().lower() in ("1", "true", "yes", "on")
+
+# Modules imported lazily by the request path, worth sharing between workers
+PRELOAD_MODULES = ("langchain.text_splitter", "PyPDF2", "pdfminer.high_level", "docx", "PIL.Image", "pytesseract",
+                   "qdrant_client", "numpy")
+
+
+def available_cpus():
+    """CPUs this process may use: affinity mask, capped by a cgroup v2/v1 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()[:2]
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def worker_count():
+    from app.vector_store import VECTOR_DB
+    value = os.getenv("RAG_WORKERS", "auto").strip().lower()
+    embedded = VECTOR_DB.lower() != "qdrant"
+    if value in ("", "auto"):
+        return 1 if embedded else available_cpus()
+    workers = max(1, int(value))
+    if workers > 1 and embedded:
+        # Workers would append to the same NumPy files with their own row
+        # counters, and embedded Qdrant locks its folder to one process
+        print(f"WARNING: RAG_WORKERS={workers} ignored: VECTOR_DB={VECTOR_DB} stores data in process and "
+              f"cannot be opened by several workers; starting 1 worker (use VECTOR_DB=qdrant for more)")
+        return 1
+    return workers
+
+
+def preload():
+    """Import and warm everything that is safe to share across fork; returns the app."""
+    start = time.perf_counter()
+    from app import app as service
+    from app import rerank, shared_cache
+    from app.vector_store import VECTOR_SIZE
+
+    if PRELOAD:
+        for name in PRELOAD_MODULES:
+            try:
+                __import__(name)
+            except Exception as e:
+                print(f"Preload skipped {name}: {e}")
+        if rerank.RERANK:
+            rerank._get_reranker()
+    shared_cache.install_embedding_cache(VECTOR_SIZE)
+    print(f"Preloaded app in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return service.app
+
+
+def bind_socket(host=HOST, port=PORT):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(asgi_app, sock):
+    import uvicorn
+    # uvicorn installs its own SIGTERM/SIGINT handlers for a graceful exit
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(asgi_app, timeout_graceful_shutdown=GRACEFUL_TIMEOUT, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, asgi_app, sock, workers):
+        self.asgi_app = asgi_app
+        self.sock = sock
+        self.workers = workers
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.asgi_app, self.sock)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        print(f"Started worker {pid}")
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        print(f"Received signal {signum}, draining {len(self.children)} workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        deadline = None
+        while self.children:
+            if self.stopping and deadline is None:
+                # Requests get GRACEFUL_TIMEOUT; leave time for the ingest pool to drain
+                deadline = time.monotonic() + GRACEFUL_TIMEOUT * 2 + 10
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                if deadline is not None and time.monotonic() > deadline:
+                    for child in list(self.children):
+                        print(f"Worker {child} did not drain in time, killing it")
+                        os.kill(child, signal.SIGKILL)
+                    deadline = float("inf")
+                time.sleep(0.2)
+                continue
+
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if not self.stopping:
+                print(f"Worker {pid} exited with {code}, restarting")
+                # Avoid a tight restart loop when workers crash on boot
+                if time.monotonic() - started < 1:
+                    time.sleep(1)
+                self.spawn()
+        self.sock.close()
+        print("All workers stopped")
+
+
+def main():
+    workers = worker_count()
+    asgi_app = preload()
+    sock = bind_socket()
+    print(f"Serving on {HOST}:{PORT} with {workers} workers (pid {os.getpid()})")
+    Supervisor(asgi_app, sock, workers).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Caches shared by all worker processes of ``python -m app.serve``.
+
+The serve supervisor creates the caches before forking. The memory is an
+anonymous MAP_SHARED mapping, so every worker reads and writes the same slots
+and a question embedded by one worker is a hit in the others. Without the
+supervisor (plain uvicorn, tests, CLIs) nothing is installed and callers fall
+back to their per-process caches.
+
+SharedVectorCache is direct-mapped: a key's 16-byte BLAKE2 digest picks one
+slot, and a later key landing on the same slot replaces it. There are no locks,
+which a worker killed mid-access could leave held forever. Each slot ends with
+a checksum of its key digest and vector; a reader that sees a torn slot (a
+concurrent or interrupted write) gets a checksum mismatch and treats it as a
+miss.
+
+    RAG_SHARED_EMBEDDING_CACHE_SLOTS  question embeddings kept (default 16384; 0 disables)
+"""
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+EMBEDDING_CACHE_SLOTS = int(os.getenv("RAG_SHARED_EMBEDDING_CACHE_SLOTS", "16384"))
+
+_DIGEST = 16
+_CHECK = 8
+
+_embedding_cache = None
+
+
+class SharedVectorCache:
+    """Fixed-size float32 vectors keyed by string, in memory shared across fork."""
+
+    def __init__(self, slots, dim):
+        self.slots = slots
+        self.dim = dim
+        # digest | float32 vector | checksum of digest and vector
+        self.slot_size = _DIGEST + 4 * dim + _CHECK
+        # Anonymous mappings are MAP_SHARED by default, so forked children share the pages
+        self._buf = mmap.mmap(-1, slots * self.slot_size)
+        self.hits = 0
+        self.misses = 0
+
+    def _slot(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=_DIGEST).digest()
+        index = struct.unpack_from("<Q", digest)[0] % self.slots
+        return digest, index * self.slot_size
+
+    @staticmethod
+    def _check(body):
+        return hashlib.blake2b(body, digest_size=_CHECK).digest()
+
+    def get(self, key):
+        digest, offset = self._slot(key)
+        # One copy of the slot; everything below checks that copy, not the shared memory
+        slot = self._buf[offset:offset + self.slot_size]
+        body, check = slot[:-_CHECK], slot[-_CHECK:]
+        if body[:_DIGEST] != digest or self._check(body) != check:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return array("f", body[_DIGEST:]).tolist()
+
+    def put(self, key, vector):
+        if len(vector) != self.dim:
+            return
+        digest, offset = self._slot(key)
+        body = digest + array("f", vector).tobytes()
+        self._buf[offset:offset + self.slot_size] = body + self._check(body)
+
+
+def install_embedding_cache(dim, slots=EMBEDDING_CACHE_SLOTS):
+    """Create the shared embedding cache; call in the supervisor before forking."""
+    global _embedding_cache
+    if slots > 0:
+        _embedding_cache = SharedVectorCache(slots, dim)
+    return _embedding_cache
+
+
+def embedding_cache():
+    """The shared embedding cache, or None when not running under the supervisor."""
+    return _embedding_cache
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Checks for the safety limits of /ingest/bulk.
+
+Archive members whose path leaves the archive root are never written, and
+RAG_BULK_MAX_FILES / RAG_BULK_MAX_BYTES apply to the whole request: loose
+uploads and every archive together. Nothing here needs a vector store; the
+requests that pass the limits are stopped before ingest.
+
+Run from the rag-service directory:
+    python -m app.test_bulk_ingest
+    python -m pytest --import-mode=importlib app/test_bulk_ingest.py
+"""
+import asyncio
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+
+from app import bulk_ingest
+
+
+def make_zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def make_tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def test_traversal_members_are_not_extracted():
+    members = {"docs/ok.txt": b"fine", "../escape.txt": b"evil", "docs/../../up.txt": b"evil",
+               "/abs/root.txt": b"rooted"}
+    for suffix, data in ((".zip", make_zip(members)), (".tar.gz", make_tar(members))):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = Path(tmp) / f"upload{suffix}"
+            archive.write_bytes(data)
+            dest = Path(tmp) / "staging" / "members"
+            result = dict((name, path) for path, name in bulk_ingest.expand_archive(archive, dest))
+
+            assert result["docs/ok.txt"] == dest / "docs" / "ok.txt"
+            assert result["../escape.txt"] is None and result["docs/../../up.txt"] is None
+            # Absolute member names are re-rooted under the staging directory
+            assert result["/abs/root.txt"] == dest / "abs" / "root.txt"
+            assert not (Path(tmp) / "escape.txt").exists() and not (Path(tmp) / "up.txt").exists()
+            written = sorted(str(p.relative_to(tmp)) for p in Path(tmp).rglob("*.txt"))
+            assert written == ["staging/members/abs/root.txt", "staging/members/docs/ok.txt"], written
+    print("Traversal members rejected in zip and tar archives")
+
+
+def test_limits_count_the_whole_request():
+    limits = bulk_ingest.RequestLimits(max_files=3, max_bytes=100)
+    with tempfile.TemporaryDirectory() as tmp:
+        first = Path(tmp) / "a.zip"
+        first.write_bytes(make_zip({"1.txt": b"x", "2.txt": b"x"}))
+        second = Path(tmp) / "b.tar"
+        second.write_bytes(make_tar({"3.txt": b"x", "4.txt": b"x"}))
+        bulk_ingest.expand_archive(first, Path(tmp) / "a", limits=limits)
+        try:
+            bulk_ingest.expand_archive(second, Path(tmp) / "b", limits=limits)
+        except ValueError as e:
+            assert "more than 3 files" in str(e)
+        else:
+            raise AssertionError("Second archive should exceed the per-request file limit")
+
+    limits = bulk_ingest.RequestLimits(max_files=10, max_bytes=100)
+    limits.add(1, 60)
+    try:
+        limits.add(1, 60)
+    except ValueError as e:
+        assert "larger than 100 bytes" in str(e)
+    else:
+        raise AssertionError("Loose uploads should count against the byte limit")
+    print("Limits apply across archives and loose uploads")
+
+
+def test_bulk_endpoint_enforces_request_limits():
+    import httpx
+    from app import app as service
+
+    async def post(files):
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/ingest/bulk", files=files)
+
+    cwd = os.getcwd()
+    saved = bulk_ingest.MAX_FILES, bulk_ingest.MAX_BYTES
+    bulk_ingest.MAX_FILES, bulk_ingest.MAX_BYTES = 3, 10 * 1024
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            # Each archive is under the limit on its own
+            archives = [("files", (f"part{i}.zip", make_zip({f"{i}-a.txt": b"x", f"{i}-b.txt": b"x"})))
+                        for i in range(2)]
+            r = asyncio.run(post(archives))
+            assert r.status_code == 400 and "more than 3 files" in r.json()["detail"], r.text
+
+            loose = [("files", (f"{i}.txt", b"x")) for i in range(4)]
+            r = asyncio.run(post(loose))
+            assert r.status_code == 400 and "more than 3 files" in r.json()["detail"], r.text
+
+            big = [("files", ("a.txt", b"x" * 6000)), ("files", ("b.txt", b"x" * 6000))]
+            r = asyncio.run(post(big))
+            assert r.status_code == 400 and "larger than" in r.json()["detail"], r.text
+
+            assert not any(Path("temp").iterdir()), "staging directory was not cleaned up"
+    finally:
+        os.chdir(cwd)
+        bulk_ingest.MAX_FILES, bulk_ingest.MAX_BYTES = saved
+    print("/ingest/bulk rejects requests over the per-request limits")
+
+
+if __name__ == "__main__":
+    test_traversal_members_are_not_extracted()
+    test_limits_count_the_whole_request()
+    test_bulk_endpoint_enforces_request_limits()
+    print("✅ Bulk ingest limits hold")
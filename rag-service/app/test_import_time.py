@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the RAG service.
+
+Runs `python -X importtime -c "import app.app"` in a fresh interpreter and fails
+when the cumulative import time of app.app exceeds the budget, or when one of the
+heavy, feature-specific libraries is imported eagerly again.
+
+Run from the rag-service directory:
+    python app/test_import_time.py
+    RAG_IMPORT_BUDGET_MS=800 python -m pytest app/test_import_time.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+IMPORT_BUDGET_MS = float(os.getenv("RAG_IMPORT_BUDGET_MS", "1000"))
+
+# Loaded on demand per file type / feature (or by the readiness warm-up), never at worker boot
+LAZY_MODULES = [
+    "qdrant_client",
+    "numpy",
+    "langchain",
+    "langchain_text_splitters",
+    "PyPDF2",
+    "pdfminer",
+    "fitz",
+    "PIL",
+    "pytesseract",
+    "docx",
+    "google.generativeai",
+    "sentence_transformers",
+]
+
+
+def measure_imports(module="app.app"):
+    """Return {module name: cumulative import time in ms} for a fresh import of `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVICE_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative) / 1000.0
+    return timings
+
+
+def test_import_time_budget():
+    timings = measure_imports()
+    total = timings["app.app"]
+    print(f"app.app cumulative import time: {total:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    assert total <= IMPORT_BUDGET_MS, f"app.app import took {total:.1f} ms, budget is {IMPORT_BUDGET_MS:.0f} ms"
+
+
+def test_heavy_modules_are_lazy():
+    timings = measure_imports()
+    eager = [m for m in LAZY_MODULES if m in timings]
+    assert not eager, f"Imported eagerly by app.app: {', '.join(eager)}"
+
+
+if __name__ == "__main__":
+    timings = measure_imports()
+    print("Slowest imports (cumulative ms):")
+    for name, ms in sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:15]:
+        print(f"  {ms:8.1f}  {name}")
+    test_heavy_modules_are_lazy()
+    test_import_time_budget()
+    print("✅ Import-time budget respected")
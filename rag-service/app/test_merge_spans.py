@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Checks for the adjacent-chunk merge of the /query post-retrieval stage.
+
+Documents are split with the ingest splitter; every merged span must equal
+the slice of the source text it covers, whether or not the split chunks
+overlap. Text without closing punctuation makes chance suffix/prefix matches
+between non-overlapping chunks likely.
+
+Run from the rag-service directory:
+    python -m app.test_merge_spans
+    python -m pytest --import-mode=importlib app/test_merge_spans.py
+"""
+import random
+from types import SimpleNamespace
+
+from app import rerank
+from app.ingest import split_text
+
+WORDS = ("in", "the", "system", "payloads", "index", "vector", "s", "query", "chunk", "a", "document", "store",
+         "overlap", "span", "merge", "text", "section", "report")
+
+
+def make_document(rng, paragraphs=12):
+    out = []
+    for _ in range(paragraphs):
+        out.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 120))))
+    return "\n\n".join(out)
+
+
+def make_hits(text, file_path="doc.txt"):
+    hits = []
+    for i, (chunk, start) in enumerate(split_text(text, with_offsets=True)):
+        payload = {"file_path": file_path, "chunk_id": i, "content": chunk,
+                   "char_start": start, "char_end": start + len(chunk)}
+        hits.append(SimpleNamespace(id=f"{file_path}-{i}", score=1.0 - i / 1000, payload=payload, vector=None))
+    return hits
+
+
+def test_merged_span_equals_source_slice():
+    rng = random.Random(7)
+    merges = 0
+    for _ in range(50):
+        text = make_document(rng)
+        hits = make_hits(text)
+        for size in (2, 3):
+            for i in range(len(hits) - size + 1):
+                window = [rerank.hit_to_candidate(h) for h in hits[i:i + size]]
+                (span,) = rerank.merge_adjacent_chunks(window, max_chunks=size)
+                payload = span["payload"]
+                assert payload["content"] == text[payload["char_start"]:payload["char_end"]], \
+                    f"chunks {i}..{i + size - 1}: merged text differs from the source slice"
+                merges += 1
+    print(f"{merges} merged spans equal their source slice")
+
+
+def test_span_length_is_capped():
+    rng = random.Random(3)
+    text = make_document(rng, paragraphs=40)
+    hits = make_hits(text)
+    candidates = [rerank.hit_to_candidate(h) for h in hits]
+    spans = rerank.merge_adjacent_chunks(candidates, max_chunks=3)
+    assert all(s["chunk_end"] - s["chunk_start"] + 1 <= 3 for s in spans)
+    assert sum(len(s["member_ids"]) for s in spans) == len(hits)
+    for s in spans:
+        payload = s["payload"]
+        assert payload["content"] == text[payload["char_start"]:payload["char_end"]]
+    print(f"{len(hits)} chunks merged into {len(spans)} spans of at most 3 chunks")
+
+
+def test_legacy_merge_ignores_short_matches():
+    # No offsets: a one-word match is not taken for overlap
+    assert rerank.merge_overlap("payloads in", "in the system") == "payloads in\nin the system"
+    left = "the splitter repeats the end of one chunk"
+    right = "the end of one chunk at the start of the next"
+    assert rerank.merge_overlap(left, right) == "the splitter repeats the end of one chunk at the start of the next"
+
+
+if __name__ == "__main__":
+    test_legacy_merge_ignores_short_matches()
+    test_merged_span_equals_source_slice()
+    test_span_length_is_capped()
+    print("✅ Merged spans match the source text")
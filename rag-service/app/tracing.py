@@ -0,0 +1,125 @@
+"""Lightweight per-request tracing for the ingest and query pipelines.
+
+Spans follow the OpenTelemetry data model (trace_id, span_id, parent_span_id,
+name, start/end time, attributes, status) and are exported as one JSON object
+per finished span, so they can be inspected locally or converted for an OTLP
+collector later without touching the instrumented code.
+
+Configuration (environment):
+    RAG_TRACE_SAMPLE_RATE  fraction of root spans (requests) to record, 0..1.
+                           Default 0: tracing is off and span() costs one
+                           context-variable lookup.
+    RAG_TRACE_EXPORTER     "console" (print, default) or "file"
+    RAG_TRACE_FILE         JSONL path for the file exporter (default ./traces.jsonl)
+
+Usage:
+    with span("ingest.split", chars=len(text)) as s:
+        chunks = split_text(text)
+        s.set_attribute("chunks", len(chunks))
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+SAMPLE_RATE = float(os.getenv("RAG_TRACE_SAMPLE_RATE", "0"))
+EXPORTER = os.getenv("RAG_TRACE_EXPORTER", "console")
+TRACE_FILE = os.getenv("RAG_TRACE_FILE", "./traces.jsonl")
+
+_current = contextvars.ContextVar("rag_current_span", default=None)
+_file_lock = threading.Lock()
+
+
+class _NoopSpan:
+    """Returned for unsampled requests; every operation is a no-op."""
+    recording = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    recording = True
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+            self.attributes["exception"] = f"{exc_type.__name__}: {exc}"
+        _export(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _export(s):
+    line = json.dumps(s.to_dict(), default=str)
+    if EXPORTER == "file":
+        with _file_lock:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    else:
+        print(f"[trace] {line}")
+
+
+def span(name, **attributes):
+    """Start a span as a child of the current one, or a new (sampled) trace."""
+    parent = _current.get()
+    if parent is None:
+        if SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE:
+            return _NoopSpan()
+        return Span(name, f"{random.getrandbits(128):032x}", None, attributes)
+    if not parent.recording:
+        return _NoopSpan()
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def current_span():
+    """The active span (a no-op span outside any trace)."""
+    return _current.get() or _NoopSpan()
@@ -0,0 +1,389 @@
+"""Vector storage backends behind one interface.
+
+Ingest, query, listing and clear only talk to a store through:
+
+    ensure_collection(collection_name, size)
+    upsert(collection_name, points)            # points: [{"id", "vector", "payload"}]
+    search(collection_name, query_vector, limit, query_filter=None, with_payload=True, with_vectors=False,
+           score_threshold=None)                # hits scoring below the threshold are not returned
+    scroll(collection_name, scroll_filter=None, limit=100, offset=None, with_payload=True, with_vectors=False)
+                                               # -> (points, next_offset); next_offset is None at the end
+    clear(collection_name, size)
+
+Hits and points expose ``id``, ``score``, ``payload`` and ``vector`` attributes.
+``with_payload`` may also be a list of payload keys to return.
+Filters use Qdrant's JSON shape ({"must": [{"key": ..., "match": {"value": ...}}]},
+with "range" conditions and "must_not" also supported).
+
+Backend selection (environment):
+    VECTOR_DB=qdrant        remote Qdrant at VECTOR_DB_URL (default http://qdrant:6333)
+    VECTOR_DB=qdrant-local  embedded Qdrant storing its data under VECTOR_DB_PATH
+    VECTOR_DB=numpy         memory-mapped float32 matrix under VECTOR_DB_PATH, searched by
+                            brute force, or IVF when VECTOR_DB_IVF_LISTS > 0 (small corpora)
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+VECTOR_SIZE = 384
+
+# Payload fields filtered on at query time, indexed in remote Qdrant
+INDEXED_PAYLOAD_FIELDS = {"page_start": "integer", "page_end": "integer"}
+VECTOR_DB = os.getenv("VECTOR_DB", "qdrant")
+VECTOR_DB_URL = os.getenv("VECTOR_DB_URL", "http://qdrant:6333")
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./vector_data")
+IVF_LISTS = int(os.getenv("VECTOR_DB_IVF_LISTS", "0"))
+IVF_PROBE = int(os.getenv("VECTOR_DB_IVF_PROBE", "4"))
+
+
+@dataclass
+class StoredPoint:
+    id: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    score: float = 0.0
+    vector: Optional[List[float]] = None
+
+
+def create_store(backend=None, url=None, path=None):
+    """Build the store selected by VECTOR_DB (or the explicit arguments)."""
+    backend = (backend or VECTOR_DB).lower()
+    if backend == "qdrant":
+        from qdrant_client import QdrantClient
+        return QdrantStore(QdrantClient(url=url or VECTOR_DB_URL))
+    if backend in ("qdrant-local", "qdrant_local", "embedded"):
+        from qdrant_client import QdrantClient
+        # Payload indexes have no effect in embedded mode (it scans payloads)
+        return QdrantStore(QdrantClient(path=path or VECTOR_DB_PATH), payload_indexes=False)
+    if backend == "numpy":
+        return NumpyStore(path or VECTOR_DB_PATH, ivf_lists=IVF_LISTS, ivf_probe=IVF_PROBE)
+    raise ValueError(f"Unsupported VECTOR_DB backend: {backend}")
+
+
+# --------- Qdrant (remote or embedded path mode) ---------
+class QdrantStore:
+    def __init__(self, client, payload_indexes=True):
+        self.client = client
+        self.payload_indexes = payload_indexes
+
+    def ensure_collection(self, collection_name, size=VECTOR_SIZE):
+        from qdrant_client.http import models as qmodels
+        try:
+            self.client.get_collection(collection_name)
+        except Exception:
+            self.client.create_collection(
+                collection_name=collection_name,
+                vectors_config=qmodels.VectorParams(size=size, distance=qmodels.Distance.COSINE)
+            )
+        if self.payload_indexes:
+            # Idempotent, so collections created before a field was added get it too
+            for field_name, schema in INDEXED_PAYLOAD_FIELDS.items():
+                try:
+                    self.client.create_payload_index(collection_name, field_name=field_name, field_schema=schema)
+                except Exception as e:
+                    print(f"Could not create payload index on {field_name}: {e}")
+
+    def clear(self, collection_name, size=VECTOR_SIZE):
+        try:
+            self.client.delete_collection(collection_name)
+        except Exception:
+            pass
+        self.ensure_collection(collection_name, size)
+
+    def upsert(self, collection_name, points):
+        from qdrant_client.http import models as qmodels
+        structs = [qmodels.PointStruct(id=p["id"], vector=p["vector"], payload=p["payload"]) for p in points]
+        self.client.upsert(collection_name=collection_name, points=structs)
+
+    @staticmethod
+    def _filter(flt):
+        if flt is None or not isinstance(flt, dict):
+            return flt
+        from qdrant_client.http import models as qmodels
+        return qmodels.Filter(**flt)
+
+    def search(self, collection_name, query_vector, limit=10, query_filter=None, with_payload=True, with_vectors=False,
+               score_threshold=None):
+        flt = self._filter(query_filter)
+        # query_points replaced search in recent qdrant-client releases
+        if hasattr(self.client, "query_points"):
+            return self.client.query_points(
+                collection_name=collection_name, query=query_vector, limit=limit,
+                query_filter=flt, with_payload=with_payload, with_vectors=with_vectors,
+                score_threshold=score_threshold,
+            ).points
+        return self.client.search(
+            collection_name=collection_name, query_vector=query_vector, limit=limit,
+            query_filter=flt, with_payload=with_payload, with_vectors=with_vectors,
+            score_threshold=score_threshold,
+        )
+
+    def scroll(self, collection_name, scroll_filter=None, limit=100, offset=None, with_payload=True, with_vectors=False):
+        return self.client.scroll(
+            collection_name=collection_name, scroll_filter=self._filter(scroll_filter), limit=limit,
+            offset=offset, with_payload=with_payload, with_vectors=with_vectors,
+        )
+
+
+# --------- NumPy memory-mapped index ---------
+def _condition_matches(payload, cond):
+    value = payload.get(cond.get("key"))
+    if "match" in cond:
+        match = cond["match"]
+        if "value" in match and value != match["value"]:
+            return False
+        if "any" in match and value not in match["any"]:
+            return False
+    if "range" in cond:
+        if value is None:
+            return False
+        bounds = cond["range"]
+        if "gte" in bounds and bounds["gte"] is not None and not value >= bounds["gte"]:
+            return False
+        if "gt" in bounds and bounds["gt"] is not None and not value > bounds["gt"]:
+            return False
+        if "lte" in bounds and bounds["lte"] is not None and not value <= bounds["lte"]:
+            return False
+        if "lt" in bounds and bounds["lt"] is not None and not value < bounds["lt"]:
+            return False
+    return True
+
+
+def _select_payload(payload, with_payload):
+    if with_payload is True:
+        return dict(payload)
+    if not with_payload:
+        return {}
+    return {k: payload[k] for k in with_payload if k in payload}
+
+
+def payload_matches(payload, flt):
+    """Evaluate a Qdrant-style JSON filter against one payload."""
+    if not flt:
+        return True
+    if any(not _condition_matches(payload, c) for c in flt.get("must", [])):
+        return False
+    if any(_condition_matches(payload, c) for c in flt.get("must_not", [])):
+        return False
+    return True
+
+
+class _NumpyCollection:
+    """One collection: vectors.f32 (row-major, L2-normalised, memory-mapped) and
+    payloads.jsonl (append-only; later lines for the same row win)."""
+
+    def __init__(self, directory, size, ivf_lists, ivf_probe):
+        import numpy as np
+        self.np = np
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = ivf_probe
+        self.vectors_path = self.dir / "vectors.f32"
+        self.payloads_path = self.dir / "payloads.jsonl"
+        self.ids: List[str] = []
+        self.payloads: List[Dict[str, Any]] = []
+        self.row_of: Dict[str, int] = {}
+        self.matrix = None
+        self._centroids = None
+        self._lists = None
+        self._trained_rows = 0
+
+        meta_path = self.dir / "meta.json"
+        if meta_path.exists():
+            self.size = json.loads(meta_path.read_text())["size"]
+        else:
+            meta_path.write_text(json.dumps({"size": size}))
+
+        if self.payloads_path.exists():
+            with open(self.payloads_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    rec = json.loads(line)
+                    row = rec["row"]
+                    if row == len(self.ids):
+                        self.ids.append(rec["id"])
+                        self.payloads.append(rec["payload"])
+                    else:
+                        self.payloads[row] = rec["payload"]
+                    self.row_of[rec["id"]] = row
+        self._remap()
+
+    def _remap(self):
+        n = len(self.ids)
+        if n and self.vectors_path.exists():
+            self.matrix = self.np.memmap(self.vectors_path, dtype=self.np.float32, mode="r", shape=(n, self.size))
+        else:
+            self.matrix = None
+
+    def _normalise(self, vectors):
+        arr = self.np.asarray(vectors, dtype=self.np.float32).reshape(-1, self.size)
+        norms = self.np.linalg.norm(arr, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return arr / norms
+
+    def upsert(self, points):
+        np = self.np
+        vectors = self._normalise([p["vector"] for p in points])
+        new_rows, updates = [], []
+        with open(self.payloads_path, "a", encoding="utf-8") as log:
+            for p, vec in zip(points, vectors):
+                pid = str(p["id"])
+                row = self.row_of.get(pid)
+                if row is None:
+                    row = len(self.ids)
+                    self.ids.append(pid)
+                    self.payloads.append(p["payload"])
+                    self.row_of[pid] = row
+                    new_rows.append(vec)
+                else:
+                    self.payloads[row] = p["payload"]
+                    updates.append((row, vec))
+                log.write(json.dumps({"row": row, "id": pid, "payload": p["payload"]}) + "\n")
+
+        if new_rows:
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(new_rows).astype(np.float32).tobytes())
+        if updates:
+            writable = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.size))
+            for row, vec in updates:
+                writable[row] = vec
+            writable.flush()
+            del writable
+        self._remap()
+
+        if self._centroids is not None:
+            if len(self.ids) > 2 * self._trained_rows:
+                self._centroids = None  # retrain lazily on the next search
+            elif new_rows:
+                first_new = len(self.ids) - len(new_rows)
+                self._assign(range(first_new, len(self.ids)))
+
+    # IVF: k-means centroids over the normalised vectors, one row list per centroid
+    def _train_ivf(self):
+        np = self.np
+        n = len(self.ids)
+        lists = min(self.ivf_lists, max(1, n // 8))
+        rng = np.random.default_rng(0)
+        sample = self.matrix[rng.choice(n, size=min(n, 20000), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+        for _ in range(10):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        self._centroids = centroids
+        self._lists = [[] for _ in range(lists)]
+        self._trained_rows = n
+        self._assign(range(n))
+
+    def _assign(self, rows, block=8192):
+        rows = list(rows)
+        for start in range(0, len(rows), block):
+            chunk = rows[start:start + block]
+            nearest = self.np.argmax(self.matrix[chunk] @ self._centroids.T, axis=1)
+            for row, c in zip(chunk, nearest):
+                self._lists[c].append(row)
+
+    def _candidate_rows(self, query):
+        np = self.np
+        n = len(self.ids)
+        if self.ivf_lists and n >= self.ivf_lists * 8:
+            if self._centroids is None:
+                self._train_ivf()
+            probe = np.argsort(-(self._centroids @ query))[:self.ivf_probe]
+            return np.fromiter((r for c in probe for r in self._lists[c]), dtype=np.int64)
+        return None  # all rows
+
+    def search(self, query_vector, limit, query_filter, with_payload, with_vectors, score_threshold=None):
+        np = self.np
+        if self.matrix is None:
+            return []
+        query = self._normalise(query_vector)[0]
+        rows = self._candidate_rows(query)
+        if query_filter:
+            candidates = range(len(self.ids)) if rows is None else rows
+            rows = np.fromiter((r for r in candidates if payload_matches(self.payloads[r], query_filter)), dtype=np.int64)
+        if rows is not None and len(rows) == 0:
+            return []
+
+        scores = (self.matrix @ query) if rows is None else (self.matrix[rows] @ query)
+        if score_threshold is not None:
+            # Only rows above the threshold take part in the top-k selection
+            keep = np.flatnonzero(scores >= score_threshold)
+            if len(keep) == 0:
+                return []
+            rows = keep if rows is None else rows[keep]
+            scores = scores[keep]
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        hits = []
+        for i in top:
+            row = int(i if rows is None else rows[i])
+            hits.append(StoredPoint(
+                id=self.ids[row],
+                score=float(scores[i]),
+                payload=_select_payload(self.payloads[row], with_payload),
+                vector=self.matrix[row].tolist() if with_vectors else None,
+            ))
+        return hits
+
+    def scroll(self, scroll_filter, limit, offset, with_payload, with_vectors):
+        row = int(offset or 0)
+        points = []
+        while row < len(self.ids) and len(points) < limit:
+            if payload_matches(self.payloads[row], scroll_filter):
+                points.append(StoredPoint(
+                    id=self.ids[row],
+                    payload=_select_payload(self.payloads[row], with_payload),
+                    vector=self.matrix[row].tolist() if with_vectors else None,
+                ))
+            row += 1
+        return points, (row if row < len(self.ids) else None)
+
+
+class NumpyStore:
+    def __init__(self, path, ivf_lists=0, ivf_probe=4):
+        self.path = Path(path)
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = ivf_probe
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def _collection(self, collection_name, size=VECTOR_SIZE):
+        coll = self._collections.get(collection_name)
+        if coll is None:
+            coll = _NumpyCollection(self.path / collection_name, size, self.ivf_lists, self.ivf_probe)
+            self._collections[collection_name] = coll
+        return coll
+
+    def ensure_collection(self, collection_name, size=VECTOR_SIZE):
+        with self._lock:
+            self._collection(collection_name, size)
+
+    def clear(self, collection_name, size=VECTOR_SIZE):
+        import shutil
+        with self._lock:
+            self._collections.pop(collection_name, None)
+            shutil.rmtree(self.path / collection_name, ignore_errors=True)
+            self._collection(collection_name, size)
+
+    def upsert(self, collection_name, points):
+        with self._lock:
+            self._collection(collection_name).upsert(points)
+
+    def search(self, collection_name, query_vector, limit=10, query_filter=None, with_payload=True, with_vectors=False,
+               score_threshold=None):
+        with self._lock:
+            return self._collection(collection_name).search(query_vector, limit, query_filter, with_payload, with_vectors,
+                                                            score_threshold)
+
+    def scroll(self, collection_name, scroll_filter=None, limit=100, offset=None, with_payload=True, with_vectors=False):
+        with self._lock:
+            return self._collection(collection_name).scroll(scroll_filter, limit, offset, with_payload, with_vectors)
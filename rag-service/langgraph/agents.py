@@ -1,6 +1,13 @@
 from langchain_core.tools import tool
+import json
+import os
 import random
+import sys
 from datetime import datetime
+from typing import Optional
+
+# Make the rag-service `app` package importable so retrieval runs in-process
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 @tool
 def get_current_time() -> str:
@@ -35,5 +42,24 @@ def customer_support_info(topic: str) -> str:
     
     return "For general support, please contact support@company.com or call 1-800-SUPPORT."
 
+@tool
+def search_documents(question: str, category_id: Optional[str] = None, limit: int = 5) -> str:
+    """Search the indexed documents for passages relevant to a question.
+
+    Returns compact references (file, chunk range, score, short preview). Use
+    read_document_chunks to get the full text of a reference when needed.
+    """
+    from app.search import retrieve, chunk_reference
+
+    candidates, _ = retrieve(question, limit, category_id=category_id)
+    return json.dumps([chunk_reference(c) for c in candidates])
+
+@tool
+def read_document_chunks(file_path: str, chunk_start: int, chunk_end: Optional[int] = None) -> str:
+    """Get the full text of chunks chunk_start..chunk_end of an indexed file."""
+    from app.search import fetch_chunks
+
+    return fetch_chunks(file_path, chunk_start, chunk_end) or "No indexed text found for that reference."
+
 # Export all tools for testing
-X = [get_current_time, generate_random_number, calculate_sum, customer_support_info]
\ No newline at end of file
+X = [get_current_time, generate_random_number, calculate_sum, customer_support_info, search_documents, read_document_chunks]
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Offline throughput benchmark for the agent graph.
+
+Runs many conversation threads concurrently against the fake model and a
+temporary SQLite checkpointer, then reports turns per second and latency.
+
+    python bench_flow.py --threads 50 --turns 5 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+async def bench(threads, turns):
+    # Import after the environment is set so flow.py picks up the fake model
+    import flow
+
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        async with flow.open_checkpointer(os.path.join(tmp, "bench.sqlite")) as saver:
+            graph = flow.build_graph(saver)
+
+            async def conversation(thread_id):
+                for turn in range(turns):
+                    start = time.perf_counter()
+                    await flow.run_turn(graph, f"question {turn}", f"bench-{thread_id}")
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(conversation(t) for t in range(threads)))
+            elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"Threads: {threads}, turns per thread: {turns}, total turns: {total}")
+    print(f"Elapsed: {elapsed:.2f}s, throughput: {total / elapsed:.1f} turns/s")
+    print(f"Latency p50: {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95: {latencies[int(total * 0.95) - 1] * 1000:.1f} ms, max: {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated LLM latency per call")
+    parser.add_argument("--tool-calls", type=int, default=2, help="tool calls emitted per user turn")
+    args = parser.parse_args()
+
+    os.environ["AGENT_LLM"] = "fake"
+    os.environ["AGENT_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["AGENT_FAKE_TOOL_CALLS"] = str(args.tool_calls)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(bench(args.threads, args.turns))
@@ -0,0 +1,60 @@
+"""Offline stand-in for ChatOllama so the agent graph can be benchmarked without a model server.
+
+Select it with AGENT_LLM=fake. When tools are bound, a fresh user turn is
+answered with one tool call per bound tool (capped by AGENT_FAKE_TOOL_CALLS),
+which exercises parallel tool execution; once tool results come back the model
+replies with plain text. AGENT_FAKE_LATENCY_MS adds a simulated per-call delay.
+"""
+import asyncio
+import os
+import time
+import uuid
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Arguments used for the fake tool calls, keyed by tool name
+_FAKE_ARGS = {
+    "get_current_time": {},
+    "generate_random_number": {"min_val": 1, "max_val": 10},
+    "calculate_sum": {"a": 2, "b": 3},
+    "customer_support_info": {"topic": "billing"},
+}
+
+
+class FakeToolChatModel(BaseChatModel):
+    latency_ms: float = float(os.getenv("AGENT_FAKE_LATENCY_MS", "0"))
+    max_tool_calls: int = int(os.getenv("AGENT_FAKE_TOOL_CALLS", "2"))
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_names": [t.name for t in tools]})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        last = messages[-1] if messages else None
+        if self.tool_names and isinstance(last, HumanMessage):
+            calls = [
+                {"name": name, "args": _FAKE_ARGS.get(name, {}), "id": f"call_{uuid.uuid4().hex[:12]}"}
+                for name in self.tool_names[:self.max_tool_calls]
+            ]
+            return AIMessage(content="", tool_calls=calls)
+        if isinstance(last, ToolMessage):
+            results = [m.content for m in messages if isinstance(m, ToolMessage)][-self.max_tool_calls:]
+            return AIMessage(content="Tool results: " + "; ".join(str(r) for r in results))
+        return AIMessage(content=f"Summary of {len(messages)} messages.")
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
@@ -1,52 +1,158 @@
-# 1. Bring in dependencies 
-from typing import Annotated 
+# 1. Bring in dependencies
+import asyncio
+import os
+import sys
+import uuid
+from typing import Annotated, TypedDict
 from langgraph.graph import START, END, StateGraph
-from langgraph.graph.message import add_messages 
-from langgraph.checkpoint.memory import InMemorySaver 
-from langchain_ollama import ChatOllama
-from colorama import Fore 
-from langgraph.prebuilt import ToolNode 
-from tool import X
+from langgraph.graph.message import add_messages
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.prebuilt import ToolNode
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
+from agents import X
+
+# Agent settings
+AGENT_LLM = os.getenv("AGENT_LLM", "ollama")  # "ollama" or "fake" (offline benchmarking)
+AGENT_MODEL = os.getenv("AGENT_MODEL", "llama3.2")
+CHECKPOINT_DB = os.getenv("AGENT_CHECKPOINT_DB", "./agent_checkpoints.sqlite")
+# Per-thread history bound: older messages are folded into a running summary
+MAX_HISTORY_MESSAGES = int(os.getenv("AGENT_MAX_HISTORY", "20"))
+SUMMARIZE_HISTORY = os.getenv("AGENT_SUMMARIZE_HISTORY", "true").lower() in ("1", "true", "yes")
+# Checkpoint retention: after every turn only the newest AGENT_KEEP_CHECKPOINTS
+# checkpoints of the thread (and their pending writes) are kept; 0 keeps all.
+# Resuming a thread needs only the newest one. SQLite reuses the freed pages,
+# so the file stops growing; VACUUM it to hand the space back to the disk.
+KEEP_CHECKPOINTS = int(os.getenv("AGENT_KEEP_CHECKPOINTS", "10"))
 
 # 2. Create LLM
-llm = ChatOllama(model='llama3.2')
+def get_llm():
+    """Return the chat model; AGENT_LLM=fake swaps in an offline stand-in."""
+    if AGENT_LLM == "fake":
+        from fake_llm import FakeToolChatModel
+        return FakeToolChatModel()
+    from langchain_ollama import ChatOllama
+    return ChatOllama(model=AGENT_MODEL)
+
+llm = get_llm()
 
 # 8. Create tool
 tools = X
 # 9. Bind LLM with tools
 llm_with_tools = llm.bind_tools(tools)
-# 10. Create Tool Node 
+# 10. Create Tool Node. Under the async API ToolNode runs all tool calls of one
+# LLM message concurrently (asyncio.gather), sync tools in the default executor.
 tool_node = ToolNode(tools)
 
 # 3. Create state
-class State(dict): 
+class State(TypedDict, total=False):
     messages: Annotated[list, add_messages]
-# 4. Build LLM node 
-def chatbot(state:State): 
-    print(state['messages'])
-    return {"messages":[llm_with_tools.invoke(state['messages'])]}
+    summary: str
+
+# Trim node: keep per-thread state bounded
+def _window_start(messages):
+    """Index of the first kept message: the newest window, starting on a user turn
+    so tool calls and their results are never separated."""
+    cut = len(messages) - MAX_HISTORY_MESSAGES
+    human = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    later = [i for i in human if i >= cut]
+    if later:
+        return later[0]
+    return human[-1] if human else 0
+
+async def trim_history(state: State):
+    messages = state["messages"]
+    if len(messages) <= MAX_HISTORY_MESSAGES:
+        return {}
+    start = _window_start(messages)
+    if start <= 0:
+        return {}
+    dropped = messages[:start]
+    update = {"messages": [RemoveMessage(id=m.id) for m in dropped]}
+
+    if SUMMARIZE_HISTORY:
+        previous = state.get("summary", "")
+        prompt = "Summarize this conversation so far in a few sentences, keeping facts the user may refer back to."
+        if previous:
+            prompt += f"\nExisting summary: {previous}"
+        try:
+            response = await llm.ainvoke([SystemMessage(content=prompt), *dropped, HumanMessage(content="Write the summary.")])
+            update["summary"] = response.content
+        except Exception as e:
+            print(f"History summarization failed, dropping old messages only: {e}")
+    return update
+
+# 4. Build LLM node
+async def chatbot(state: State):
+    messages = state["messages"]
+    if state.get("summary"):
+        messages = [SystemMessage(content=f"Summary of earlier conversation: {state['summary']}"), *messages]
+    return {"messages": [await llm_with_tools.ainvoke(messages)]}
 # 11. Create Router Node
-def router(state:State): 
+def router(state: State):
     last_message = state['messages'][-1]
-    if hasattr(last_message, 'tool_calls') and last_message.tool_calls: 
-        return "tools" 
-    else: 
-        return END 
+    if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
+        return "tools"
+    else:
+        return END
 
-# 5. Assemble Graph 
+# 5. Assemble Graph
 graph_builder = StateGraph(State)
+graph_builder.add_node("trim", trim_history)
 graph_builder.add_node("chatbot", chatbot)
 graph_builder.add_node("tools", tool_node)
-graph_builder.add_edge(START, "chatbot")
+graph_builder.add_edge(START, "trim")
+graph_builder.add_edge("trim", "chatbot")
 # 12. Update graph for Tools
 graph_builder.add_edge("tools", "chatbot")
 graph_builder.add_conditional_edges("chatbot", router)
-# 6. Add Memory and Compile Graph 
-memory = InMemorySaver() 
-graph = graph_builder.compile(checkpointer=memory)
+
+# 6. Add Memory and Compile Graph
+def open_checkpointer(path=CHECKPOINT_DB):
+    """Disk-backed checkpointer; use as `async with open_checkpointer() as saver:`."""
+    return AsyncSqliteSaver.from_conn_string(path)
+
+def build_graph(checkpointer):
+    return graph_builder.compile(checkpointer=checkpointer)
+
+async def prune_checkpoints(saver, thread_id, keep=KEEP_CHECKPOINTS):
+    """Delete all but the newest `keep` checkpoints of one thread, with their writes."""
+    if keep <= 0:
+        return
+    async with saver.lock:
+        # Checkpoint IDs are time-ordered (uuid6), so the newest sort last
+        await saver.conn.execute(
+            """DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN (
+                   SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?
+                   ORDER BY checkpoint_id DESC LIMIT ?)""",
+            (thread_id, thread_id, keep),
+        )
+        await saver.conn.execute(
+            """DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN (
+                   SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)""",
+            (thread_id, thread_id),
+        )
+        await saver.conn.commit()
+
+async def run_turn(graph, prompt, thread_id):
+    """Run one user turn on a thread and return the final assistant message."""
+    result = await graph.ainvoke(
+        {"messages": [{"role": "user", "content": prompt}]},
+        config={"configurable": {"thread_id": str(thread_id)}},
+    )
+    await prune_checkpoints(graph.checkpointer, str(thread_id))
+    return result['messages'][-1]
+
 # 7. Build call loop and run it
-if __name__ == '__main__': 
-    while True: 
-        prompt = input("🤖 Pass your prompt here: " )
-        result = graph.invoke({"messages":[{"role":"user", "content":prompt}]}, config={"configurable":{"thread_id":1234}})
-        print(Fore.LIGHTYELLOW_EX + result['messages'][-1].content + Fore.RESET) 
+async def main(thread_id):
+    from colorama import Fore
+    async with open_checkpointer() as saver:
+        graph = build_graph(saver)
+        print(f"Thread: {thread_id}")
+        while True:
+            prompt = await asyncio.to_thread(input, "🤖 Pass your prompt here: ")
+            message = await run_turn(graph, prompt, thread_id)
+            print(Fore.LIGHTYELLOW_EX + message.content + Fore.RESET)
+
+if __name__ == '__main__':
+    # Resume a conversation by passing its thread id; otherwise start a new one
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else uuid.uuid4().hex))